@@ -0,0 +1,86 @@
+"""Dashboard age bucketing at 1M meters: per-meter loop vs the sorted timestamp index.
+
+Run from this directory:  python age_index_benchmark.py
+"""
+import random
+import time
+from operator import itemgetter
+
+from lambda_loader import load_lambda
+
+METERS = 1_000_000
+NOW = 1750000000.0
+DAY = 60 * 60 * 24
+MONTH = DAY * 30
+
+
+def loop_original(items, now):
+    # Baseline: the loop dashboard-generation.py started with (unsorted buckets)
+    buckets = {"6+ months old": [], "9+ months old": [], "12+ months old": []}
+    for item in items:
+        ts = int(item.get("timestamp", 0))
+        months_old = (now - ts) / (60 * 60 * 24 * 30)
+        if months_old >= 12:
+            buckets["12+ months old"].append(item)
+        elif months_old >= 9:
+            buckets["9+ months old"].append(item)
+        elif months_old >= 6:
+            buckets["6+ months old"].append(item)
+    return buckets
+
+
+def loop_sorted(items, now):
+    # Baseline: the loop plus the per-bucket sort the paginated renderer needs
+    buckets = loop_original(items, now)
+    for label, rows in buckets.items():
+        keyed = [((int(item.get("timestamp", 0)), str(item['serialNumber'])), item) for item in rows]
+        keyed.sort(key=itemgetter(0))
+        buckets[label] = [item for _, item in keyed]
+    return buckets
+
+
+def timed(fn, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_items(granularity):
+    return [
+        {
+            'serialNumber': str(random.randint(10**9, 10**10 - 1)),
+            'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+            'timestamp': int(NOW - random.uniform(0, 24) * MONTH) // granularity * granularity,
+        }
+        for _ in range(METERS)
+    ]
+
+
+def main():
+    random.seed(0)
+    dashboard = load_lambda('dashboard-generation')
+
+    # Day granularity is what df.json holds: many meters share each timestamp
+    for label, granularity in (('per-second timestamps', 1), ('day-granularity timestamps', DAY)):
+        items = make_items(granularity)
+        original_time, original = timed(lambda: loop_original(items, NOW), repeat=1)
+        sorted_time, expected = timed(lambda: loop_sorted(items, NOW), repeat=1)
+        build_time, index = timed(lambda: dashboard.AgeIndex(items), repeat=1)
+        query_time, buckets = timed(lambda: index.buckets(NOW))
+
+        assert {label: len(rows) for label, rows in buckets.items()} == {label: len(rows) for label, rows in original.items()}
+        assert all(buckets[label] == expected[label] for label in expected)
+
+        print(f"{METERS} meters, {label}: " + ", ".join(f"{label}: {len(rows)}" for label, rows in buckets.items()))
+        print(f"  loop (original, unsorted)     {original_time * 1000:9.1f} ms")
+        print(f"  loop + sort per bucket        {sorted_time * 1000:9.1f} ms")
+        print(f"  AgeIndex build, once per view  {build_time * 1000:9.1f} ms")
+        print(f"  AgeIndex.buckets (bisect)     {query_time * 1000:9.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Warm-invocation cost of AWS clients: per-invocation boto3 clients vs the shared aws_runtime clients.
+
+Starts a local HTTPS endpoint that answers DynamoDB GetItem (with a self-signed
+certificate made by the ``openssl`` CLI) and points real botocore clients at it,
+so client construction, TLS handshakes and connection pooling are all measured.
+Each simulated invocation performs one GetItem; the concurrent run issues 32 at
+once, the way meter_fanout's workers do.
+
+Run from this directory:  python aws_runtime_benchmark.py
+"""
+import json
+import logging
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from botocore.config import Config
+
+from lambda_loader import LAMBDAS_DIR  # noqa: F401  (puts the lambdas on sys.path)
+import aws_runtime
+
+INVOCATIONS = 200
+CONCURRENT_CALLS = 32
+CONCURRENT_ROUNDS = 20
+SERVER_LATENCY = 0.002
+
+ITEM = {'Item': {'serialNumber': {'S': '2005993218'}, 'zipcode': {'S': '91214'},
+                 'coordinate': {'L': [{'N': '34.2437922136'}, {'N': '-118.2602094146'}]}}}
+
+
+class DynamoDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(SERVER_LATENCY)
+        body = json.dumps(ITEM).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(workdir):
+    cert, key = os.path.join(workdir, 'cert.pem'), os.path.join(workdir, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=DNS:localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    server = ThreadingHTTPServer(('localhost', 0), DynamoDBHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cert
+
+
+def get_item(client):
+    return client.get_item(TableName='MeterReferenceTable', Key={'serialNumber': {'S': '2005993218'}})
+
+
+def per_invocation(invocations):
+    # Before: a new client (and so a new connection pool) in every invocation
+    timings = []
+    for _ in range(invocations):
+        start = time.perf_counter()
+        get_item(boto3.client('dynamodb'))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def shared(client_for, invocations):
+    timings = []
+    for _ in range(invocations):
+        start = time.perf_counter()
+        get_item(client_for())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def concurrent(client, rounds):
+    timings = []
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CALLS) as pool:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            list(pool.map(lambda _: get_item(client), range(CONCURRENT_CALLS)))
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure(label, fn, unit_count):
+    before = DynamoDBHandler.connections
+    timings = fn()
+    opened = DynamoDBHandler.connections - before
+    print(f"  {label:<40}{statistics.median(timings) * 1000:9.2f} ms{statistics.quantiles(timings, n=20)[-1] * 1000:9.2f} ms"
+          f"{opened:>7} TLS connections for {unit_count}")
+
+
+def main():
+    # The default pool discards the connections it has no room for, logging each one
+    logging.getLogger('urllib3').setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as workdir:
+        server, cert = start_server(workdir)
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = f'https://localhost:{server.server_address[1]}'
+        os.environ['AWS_CA_BUNDLE'] = cert
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+        print(f"local HTTPS DynamoDB endpoint, {SERVER_LATENCY * 1000:.0f} ms per request")
+        print(f"\none GetItem per warm invocation, {INVOCATIONS} invocations")
+        print(f"  {'':<40}{'median':>12}{'p95':>12}")
+        measure('boto3.client per invocation (before)', lambda: per_invocation(INVOCATIONS), INVOCATIONS)
+        default_client = boto3.client('dynamodb')
+        measure('module-scope client, default config', lambda: shared(lambda: default_client, INVOCATIONS), INVOCATIONS)
+        measure('aws_runtime.client', lambda: shared(lambda: aws_runtime.client('dynamodb'), INVOCATIONS), INVOCATIONS)
+
+        print(f"\n{CONCURRENT_CALLS} concurrent GetItems, {CONCURRENT_ROUNDS} rounds")
+        print(f"  {'':<40}{'median':>12}{'p95':>12}")
+        default_client = boto3.client('dynamodb', config=Config(retries={'mode': 'legacy'}))
+        measure('default pool (10 connections)', lambda: concurrent(default_client, CONCURRENT_ROUNDS), CONCURRENT_ROUNDS)
+        tuned = aws_runtime.CLIENT_CONFIG.max_pool_connections
+        measure(f'aws_runtime pool ({tuned} connections)', lambda: concurrent(aws_runtime.client('dynamodb'), CONCURRENT_ROUNDS),
+                CONCURRENT_ROUNDS)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
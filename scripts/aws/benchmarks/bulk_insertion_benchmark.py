@@ -0,0 +1,72 @@
+"""Syncing a day of offline route readings: N single submissions vs one bulk submission.
+
+Both run the real water-meter-data-insertion handler against the in-memory
+``local_dynamodb`` stand-in with a simulated DynamoDB round-trip. Handler time
+is measured; end-to-end time adds a modeled per-call cost of the HTTPS request
+through API Gateway and the Lambda invocation, which the bulk path pays once.
+
+Run from this directory:  python bulk_insertion_benchmark.py
+"""
+import contextlib
+import io
+import json
+import random
+import time
+
+from lambda_loader import load_lambda
+from local_dynamodb import LocalDynamoDB
+from ttl_cache import TTLCache
+
+DYNAMODB_LATENCY = 0.005
+API_CALL_SECONDS = 0.060
+READINGS = (50, 200, 1000)
+
+
+def setup(insertion, meters):
+    db = LocalDynamoDB(latency=DYNAMODB_LATENCY)
+    reference = db.create_table('MeterReferenceTable', ('serialNumber',))
+    reference.load({'serialNumber': serial, 'zipcode': '91214', 'coordinate': [34.2, -118.2]} for serial in meters)
+    meter_table = db.create_table('WaterMeterTable', ('serialNumber', 'timestamp'))
+    insertion.dynamodb = db
+    insertion.ReferenceTable = reference
+    insertion.MeterTable = meter_table
+    insertion.reference_cache = TTLCache(10000, 3600, 30)
+    return db, reference, meter_table
+
+
+def requests_made(db):
+    return db.requests + sum(table.requests for table in db.tables.values())
+
+
+def main():
+    random.seed(0)
+    insertion = load_lambda('water-meter-data-insertion')
+    print(f"simulated DynamoDB round-trip {DYNAMODB_LATENCY * 1000:.0f} ms, "
+          f"modeled API call {API_CALL_SECONDS * 1000:.0f} ms")
+    print(f"  {'readings':>8}  {'mode':<8}{'handler':>10}{'end to end':>13}{'DynamoDB requests':>19}")
+    for count in READINGS:
+        meters = [str(serial) for serial in random.sample(range(10**9, 10**10), count)]
+        readings = [{'serialNumber': serial, 'meterValue': round(random.uniform(1000, 8000), 2), 'date': '2025-06-01'}
+                    for serial in meters]
+
+        db, _, meter_table = setup(insertion, meters)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            statuses = [insertion.lambda_handler({'body': json.dumps(reading)}, None)['statusCode']
+                        for reading in readings]
+        single = time.perf_counter() - start
+        assert statuses == [200] * count and len(meter_table.items) == count
+        print(f"  {count:>8}  {'single':<8}{single:>8.2f} s{single + count * API_CALL_SECONDS:>11.2f} s"
+              f"{requests_made(db):>19}")
+
+        db, _, meter_table = setup(insertion, meters)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = insertion.lambda_handler({'body': json.dumps({'readings': readings})}, None)
+        bulk = time.perf_counter() - start
+        assert response['statusCode'] == 200 and len(meter_table.items) == count
+        print(f"  {count:>8}  {'bulk':<8}{bulk:>8.2f} s{bulk + API_CALL_SECONDS:>11.2f} s{requests_made(db):>19}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Size, encode and parse cost of the df.json list format vs the columnar snapshot format.
+
+Run from this directory:  python columnar_snapshot_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+import columnar_snapshot
+import decimal_json
+
+READINGS = 100_000
+METERS = 5_000
+
+
+def make_readings(n, meters):
+    serials = [str(random.randint(10**9, 10**10 - 1)) for _ in range(meters)]
+    zipcodes = ['91020', '91214', '91011', '91208', '91046']
+    return [
+        {
+            'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+            'date': f'2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}',
+            'zipcode': random.choice(zipcodes),
+            'timestamp': 1704067200 + i * 60,
+            'coordinate': [round(random.uniform(34.20, 34.27), 10), round(random.uniform(-118.30, -118.20), 10)],
+            'uuid': str(uuid.uuid4()),
+            'serialNumber': random.choice(serials),
+        }
+        for i in range(n)
+    ]
+
+
+def measure(encode):
+    start = time.perf_counter()
+    raw = encode()
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    columnar_snapshot.loads(raw)
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    columnar_snapshot.loads(raw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(raw), encode_ms, decode_ms, peak
+
+
+def main():
+    random.seed(0)
+    data = make_readings(READINGS, METERS)
+    formats = [
+        ('df.json list', lambda: decimal_json.dumps(data).encode('utf-8')),
+        ('columnar', lambda: columnar_snapshot.dumps(data)),
+        ('columnar + gzip', lambda: columnar_snapshot.dumps(data, compress=True)),
+    ]
+    print(f"{READINGS} readings, {METERS} meters")
+    print(f"{'format':>16} {'bytes':>11} {'encode ms':>10} {'parse ms':>9} {'parse peak MB':>14}")
+    for label, encode in formats:
+        size, encode_ms, decode_ms, peak = measure(encode)
+        print(f"{label:>16} {size:>11} {encode_ms:>10.1f} {decode_ms:>9.1f} {peak / 2**20:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
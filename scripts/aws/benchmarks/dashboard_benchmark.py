@@ -0,0 +1,91 @@
+"""Stale-meter dashboard: single page built with ``html +=`` vs the paginated, streamed pages.
+
+Renders 100k stale meters and reports render time and peak traced memory. The
+new renderer is measured the way the lambda uses it, consuming one page at a time.
+
+Run from this directory:  python dashboard_benchmark.py
+"""
+import random
+import time
+import tracemalloc
+
+from lambda_loader import load_lambda
+
+METERS = 100_000
+NOW = 1750000000
+
+
+def render_single_page(buckets):
+    # Baseline: the renderer as it was in dashboard-generation.py
+    html = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Old Meters Dashboard</title>
+        </head>
+        <body>
+            <h1>Water Meters Needing Update</h1>
+        """
+    for label, items in buckets.items():
+        html += f"""
+            <div class="section">
+                <h2>{label} ({len(items)})</h2>
+                <table>
+                    <tr><th>Serial Number</th><th>Meter Value</th><th>Timestamp</th></tr>
+            """
+        for item in items:
+            html += f"<tr><td>{item['serialNumber']}</td><td>{item['meterValue']}</td><td>{item['timestamp']}</td></tr>"
+        html += "</table></div>"
+    html += "</body></html>"
+    return [('meter_dashboard.html', html)]
+
+
+def render_paginated(dashboard, buckets, page_size):
+    index = dashboard.render_index(buckets, page_size)
+    largest = len(index)
+    count = 1
+    for _, page in dashboard.render_pages(buckets, page_size):
+        largest = max(largest, len(page))
+        count += 1
+    return count, largest
+
+
+def measure(fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    random.seed(0)
+    dashboard = load_lambda('dashboard-generation')
+    month = 60 * 60 * 24 * 30
+    meters = [
+        {
+            'serialNumber': str(random.randint(10**9, 10**10 - 1)),
+            'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+            'timestamp': NOW - random.randint(6 * month, 24 * month),
+        }
+        for _ in range(METERS)
+    ]
+    buckets = dashboard.bucket_by_age(meters, NOW)
+    print(f"{METERS} stale meters: " + ", ".join(f"{label}: {len(rows)}" for label, rows in buckets.items()))
+
+    old_time, old_peak, old_pages = measure(lambda: render_single_page(buckets))
+    print(f"  html += single page   {old_time * 1000:8.1f} ms  peak {old_peak / 2**20:7.1f} MiB  "
+          f"1 page of {len(old_pages[0][1]) / 2**20:.1f} MiB")
+
+    for page_size in (500, 1000, 5000):
+        new_time, new_peak, (count, largest) = measure(lambda: render_paginated(dashboard, buckets, page_size))
+        print(f"  paginated, {page_size:>4}/page  {new_time * 1000:8.1f} ms  peak {new_peak / 2**20:7.1f} MiB  "
+              f"{count} pages, largest {largest / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
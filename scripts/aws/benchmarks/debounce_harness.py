@@ -0,0 +1,99 @@
+"""Render counts and freshness of the map/dashboard renderers under bursty load.
+
+Simulates one FIFO render queue (batches of up to 10 messages, one message per new
+snapshot version) consumed by a renderer that takes RENDER_SECONDS per render, with
+a virtual clock driving the real Debouncer. Freshness latency is the time from a
+change being published until a finished render includes it.
+
+Run from this directory:  python debounce_harness.py
+"""
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from debounce import DEFER, SKIP, Debouncer
+
+RENDER_SECONDS = 3.0
+SKIP_SECONDS = 0.05
+BATCH_SIZE = 10
+MAX_STALENESS = 60.0
+
+POLICIES = [
+    ('every batch (before)', None),
+    ('drop superseded', 0.0),
+    ('window 5s', 5.0),
+    ('window 15s', 15.0),
+]
+
+
+def scenarios():
+    random.seed(0)
+    yield 'burst: 500 changes in 10s', sorted(random.uniform(0, 10) for _ in range(500))
+    yield 'steady: 1 change every 2s for 5 min', [i * 2.0 for i in range(150)]
+    bursts = []
+    for start in range(0, 5 * 90, 90):
+        bursts.extend(start + random.uniform(0, 30) for _ in range(100))
+    yield 'bursty: 5 x 100 changes in 30s, 60s apart', sorted(bursts)
+
+
+def simulate(arrivals, window):
+    now = 0.0
+    debouncer = Debouncer(window=window or 0.0, max_staleness=MAX_STALENESS, clock=lambda: now)
+    renders, skips, deferrals = [], 0, 0
+    position = 0
+    visible_at = 0.0
+
+    while position < len(arrivals):
+        now = max(now, arrivals[position], visible_at)
+        batch = [seq for seq in range(position, min(position + BATCH_SIZE, len(arrivals))) if arrivals[seq] <= now]
+        batch_seq = batch[-1]
+        head_seq = max(seq for seq in range(batch_seq, len(arrivals)) if arrivals[seq] <= now)
+
+        if window is None:
+            # Before: every batch renders the newest version it carries
+            now += RENDER_SECONDS
+            renders.append((now, batch_seq))
+            position += len(batch)
+            continue
+
+        action, delay = debouncer.decide(batch_seq, head_seq, arrivals[batch[-1]], arrivals[batch[0]])
+        if action == SKIP:
+            skips += 1
+            now += SKIP_SECONDS
+            position += len(batch)
+        elif action == DEFER:
+            # Hidden for the rest of the window (rounded up like debounce.defer); the
+            # FIFO group delivers nothing else until the batch is deleted
+            deferrals += 1
+            visible_at = now + int(delay) + 1
+        else:
+            now += RENDER_SECONDS
+            renders.append((now, head_seq))
+            debouncer.rendered(head_seq)
+            position += len(batch)
+
+    latencies = []
+    for seq, published in enumerate(arrivals):
+        finished = next(end for end, rendered in renders if rendered >= seq)
+        latencies.append(finished - published)
+    return renders, skips, deferrals, latencies
+
+
+def main():
+    print(f"render takes {RENDER_SECONDS}s, max staleness {MAX_STALENESS:.0f}s, batches of up to {BATCH_SIZE}")
+    for name, arrivals in scenarios():
+        print(f"\n{name}")
+        print(f"  {'policy':<22}{'renders':>8}{'skipped':>8}{'deferred':>9}"
+              f"{'mean s':>8}{'p95 s':>8}{'max s':>8}")
+        for label, window in POLICIES:
+            renders, skips, deferrals, latencies = simulate(arrivals, window)
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"  {label:<22}{len(renders):>8}{skips:>8}{deferrals:>9}"
+                  f"{statistics.mean(latencies):8.1f}{p95:8.1f}{max(latencies):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""decimal_json vs the DecimalEncoder previously copied into the lambdas, on a 100k-reading snapshot.
+
+Run from this directory:  python decimal_json_benchmark.py
+"""
+import io
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections.abc import Iterable, Mapping
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+import decimal_json
+
+READINGS = 100_000
+
+
+class DecimalEncoder(json.JSONEncoder):
+    # Baseline: the encoder as it was in df-updater.py and the stream handlers
+    def encode(self, obj):
+        if isinstance(obj, Mapping):
+            return '{' + ', '.join(f'{self.encode(k)}: {self.encode(v)}' for (k, v) in obj.items()) + '}'
+        elif isinstance(obj, Iterable) and not isinstance(obj, str):
+            return '[' + ', '.join(map(self.encode, obj)) + ']'
+        elif isinstance(obj, Decimal):
+            return f'{obj.normalize():f}'
+        else:
+            return super().encode(obj)
+
+
+def make_readings(n, as_decimal):
+    num = (lambda v: Decimal(str(v))) if as_decimal else (lambda v: v)
+    return [
+        {
+            'meterValue': num(round(random.uniform(1000.0, 8000.0), 2)),
+            'date': '2024-06-24',
+            'zipcode': '91214',
+            'timestamp': num(1704067200 + i),
+            'coordinate': [num(round(random.uniform(34.20, 34.27), 10)),
+                           num(round(random.uniform(-118.30, -118.20), 10))],
+            'uuid': str(uuid.uuid4()),
+            'serialNumber': str(random.randint(10**9, 10**10 - 1)),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    random.seed(0)
+    for label, as_decimal in [('float values (df-updater)', False), ('Decimal values (DynamoDB images)', True)]:
+        data = make_readings(READINGS, as_decimal)
+        old_time, old_text = timed(lambda: json.dumps(data, indent=2, cls=DecimalEncoder), repeat=1)
+        new_time, new_text = timed(lambda: decimal_json.dumps(data))
+        compact_time, compact_text = timed(lambda: decimal_json.dumps(data, compact=True))
+
+        def stream():
+            buffer = io.StringIO()
+            decimal_json.dump(data, buffer)
+            return buffer.getvalue()
+        stream_time, stream_text = timed(stream)
+
+        assert new_text == old_text and stream_text == old_text
+
+        print(f"{READINGS} readings, {label}")
+        print(f"  DecimalEncoder       {old_time * 1000:8.1f} ms  {len(old_text):>10} bytes")
+        print(f"  decimal_json.dumps   {new_time * 1000:8.1f} ms  {len(new_text):>10} bytes  ({old_time / new_time:.1f}x)")
+        print(f"  dumps(compact=True)  {compact_time * 1000:8.1f} ms  {len(compact_text):>10} bytes")
+        print(f"  decimal_json.dump    {stream_time * 1000:8.1f} ms  (streamed in chunks)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Import the lambda handlers (whose file names contain dashes) for local benchmarks."""
+import importlib.util
+import os
+import sys
+
+LAMBDAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas')
+
+sys.path.insert(0, LAMBDAS_DIR)
+# boto3 clients created at import time need a region, even though the benchmarks stub them
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-1')
+
+
+def load_lambda(name):
+    path = os.path.join(LAMBDAS_DIR, f'{name}.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,137 @@
+"""Local stand-in for Cognito's OAuth2 token endpoint, for offline benchmarks.
+
+``LocalCognito`` serves ``POST /oauth2/token`` over HTTPS (with a self-signed
+certificate made by the ``openssl`` CLI) for the ``authorization_code`` and
+``refresh_token`` grants, answering like Cognito: tokens as JSON, or a 400 with
+``invalid_grant`` for codes that were already used and refresh tokens it didn't
+issue. Codes are issued with ``authorize()``, as the hosted login page would.
+
+Each request sleeps ``latency`` seconds. A keep-alive connection left idle for
+``idle_timeout`` seconds is closed without notice, as Cognito's load balancers
+do, so the next request on it finds it closed.
+"""
+import base64
+import json
+import os
+import secrets
+import ssl
+import subprocess
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXPIRES_IN = 3600
+
+
+def fake_jwt(claims):
+    encode = lambda value: base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b'=').decode()
+    return '.'.join([encode({'alg': 'none'}), encode(claims), secrets.token_urlsafe(32)])
+
+
+class LocalCognito:
+    def __init__(self, client_id, client_secret, redirect_uri, latency=0.005, idle_timeout=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.latency = latency
+        self.idle_timeout = idle_timeout
+        self.codes = set()
+        self.refresh_tokens = set()
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, workdir):
+        """Start serving on a free localhost port; returns the certificate file to trust."""
+        cert, key = os.path.join(workdir, 'cert.pem'), os.path.join(workdir, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                        '-addext', 'subjectAltName=DNS:localhost', '-keyout', key, '-out', cert],
+                       check=True, capture_output=True)
+        self.server = ThreadingHTTPServer(('localhost', 0), self.handler_class())
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return cert
+
+    @property
+    def domain(self):
+        return f'localhost:{self.server.server_address[1]}'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def authorize(self):
+        """A new single-use authorization code, as the login redirect carries."""
+        code = secrets.token_urlsafe(16)
+        with self.lock:
+            self.codes.add(code)
+        return code
+
+    def grant(self, form):
+        """``(status, body)`` for a token request's form fields."""
+        if form.get('client_id') != self.client_id or form.get('client_secret') != self.client_secret:
+            return 400, {'error': 'invalid_client'}
+        grant_type = form.get('grant_type')
+        with self.lock:
+            if grant_type == 'authorization_code':
+                if form.get('redirect_uri') != self.redirect_uri or form.get('code') not in self.codes:
+                    return 400, {'error': 'invalid_grant'}
+                self.codes.discard(form['code'])
+                refresh_token = secrets.token_urlsafe(64)
+                self.refresh_tokens.add(refresh_token)
+            elif grant_type == 'refresh_token':
+                if form.get('refresh_token') not in self.refresh_tokens:
+                    return 400, {'error': 'invalid_grant'}
+                # Cognito doesn't return a new refresh token when refreshing
+                refresh_token = None
+            else:
+                return 400, {'error': 'unsupported_grant_type'}
+
+        claims = {'sub': secrets.token_hex(8), 'aud': self.client_id, 'exp': int(time.time()) + EXPIRES_IN}
+        tokens = {'id_token': fake_jwt(claims), 'access_token': fake_jwt(claims),
+                  'expires_in': EXPIRES_IN, 'token_type': 'Bearer'}
+        if refresh_token:
+            tokens['refresh_token'] = refresh_token
+        return 200, tokens
+
+    def handler_class(self):
+        cognito = self
+
+        class TokenHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                # Read per connection, so the idle timeout can change while serving
+                self.timeout = cognito.idle_timeout
+                super().setup()
+                with cognito.lock:
+                    cognito.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode('ascii')))
+                time.sleep(cognito.latency)
+                if self.path == '/oauth2/token':
+                    status, tokens = cognito.grant(form)
+                else:
+                    status, tokens = 404, {'error': 'not_found'}
+                with cognito.lock:
+                    cognito.requests += 1
+
+                body = json.dumps(tokens).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return TokenHandler
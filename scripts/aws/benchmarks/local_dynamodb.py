@@ -0,0 +1,199 @@
+"""In-memory stand-in for the DynamoDB resource and tables the lambdas use, for offline benchmarks.
+
+``LocalTable`` accepts the resource-level Table calls the lambdas make (query,
+get_item, put_item, update_item, delete_item, batch_writer) with each request
+sleeping ``latency`` seconds, like a round-trip. Queries return at most
+``page_size`` items with a LastEvaluatedKey. A ``throttle_rate`` share of
+single-item write attempts are throttled, and the same share of each batch
+write comes back in UnprocessedItems. Like the SDK, a throttled single-item
+write is attempted up to ``max_attempts`` times (each a request), reporting
+ResponseMetadata.RetryAttempts, before failing with
+ProvisionedThroughputExceededException.
+
+``LocalDynamoDB`` plays the service resource: ``Table(name)`` and the
+multi-table calls. For batch_get_item the same share of keys comes back in
+UnprocessedKeys. ``meta.client.transact_write_items`` applies Puts all or
+nothing, supporting ``attribute_not_exists(...)`` conditions.
+"""
+import random
+import threading
+import time
+
+from boto3.dynamodb.table import BatchWriter
+from botocore.exceptions import ClientError
+
+
+def throttling_error(operation):
+    return ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                  'Message': 'Rate of requests exceeds the allowed throughput.'}}, operation)
+
+
+class LocalTable:
+    def __init__(self, name, key_names, latency=0.002, page_size=1000, throttle_rate=0.0, seed=0,
+                 max_attempts=1):
+        self.name = name
+        self.key_names = tuple(key_names)
+        self.latency = latency
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.max_attempts = max_attempts
+        self.items = {}
+        self.requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def _request(self, operation, throttle=False):
+        """Make the request, returning its ResponseMetadata."""
+        for attempt in range(self.max_attempts if throttle else 1):
+            time.sleep(self.latency)
+            with self._lock:
+                self.requests += 1
+                if not (throttle and self.throttle_rate and self._random.random() < self.throttle_rate):
+                    return {'RetryAttempts': attempt}
+                self.throttled += 1
+        raise throttling_error(operation)
+
+    def load(self, items):
+        for item in items:
+            self.items[self._key(item)] = dict(item)
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None, Limit=None, **kwargs):
+        self._request('Query')
+        # Only the equality on the partition key the lambdas use is supported
+        partition = KeyConditionExpression.get_expression()['values'][1]
+        keys = sorted(key for key in self.items if key[0] == partition)
+        if ExclusiveStartKey is not None:
+            start = self._key(ExclusiveStartKey)
+            keys = [key for key in keys if key > start]
+        limit = min(Limit or self.page_size, self.page_size)
+        page = [dict(self.items[key]) for key in keys[:limit]]
+        response = {'Items': page, 'Count': len(page)}
+        if len(keys) > limit:
+            response['LastEvaluatedKey'] = {name: page[-1][name] for name in self.key_names}
+        return response
+
+    def get_item(self, Key, **kwargs):
+        self._request('GetItem')
+        item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        metadata = self._request('PutItem', throttle=True)
+        with self._lock:
+            self.items[self._key(Item)] = dict(Item)
+        return {'ResponseMetadata': metadata}
+
+    def delete_item(self, Key, **kwargs):
+        metadata = self._request('DeleteItem', throttle=True)
+        with self._lock:
+            self.items.pop(self._key(Key), None)
+        return {'ResponseMetadata': metadata}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        metadata = self._request('UpdateItem', throttle=True)
+        # Only "SET a = :x, b = :y" expressions are supported
+        assignments = UpdateExpression.split('SET', 1)[1].split(',')
+        with self._lock:
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            for assignment in assignments:
+                name, value = (part.strip() for part in assignment.split('='))
+                item[name] = ExpressionAttributeValues[value]
+        return {'ResponseMetadata': metadata}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._request('BatchWriteItem')
+        unprocessed = []
+        with self._lock:
+            for request in RequestItems[self.name]:
+                # Like DynamoDB under load, part of a batch can come back unprocessed
+                if self.throttle_rate and self._random.random() < self.throttle_rate:
+                    unprocessed.append(request)
+                elif 'PutRequest' in request:
+                    item = request['PutRequest']['Item']
+                    self.items[self._key(item)] = dict(item)
+                else:
+                    self.items.pop(self._key(request['DeleteRequest']['Key']), None)
+        return {'UnprocessedItems': {self.name: unprocessed} if unprocessed else {}}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return BatchWriter(self.name, self, overwrite_by_pkeys=overwrite_by_pkeys)
+
+
+class LocalDynamoDB:
+    def __init__(self, latency=0.002, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.tables = {}
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.meta = type('Meta', (), {'client': self})()
+
+    def create_table(self, name, key_names, **kwargs):
+        kwargs.setdefault('latency', self.latency)
+        kwargs.setdefault('throttle_rate', self.throttle_rate)
+        self.tables[name] = LocalTable(name, key_names, **kwargs)
+        return self.tables[name]
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        time.sleep(self.latency)
+        keys = sum(len(request['Keys']) for request in RequestItems.values())
+        if keys > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Too many items requested for the BatchGetItem call'}},
+                              'BatchGetItem')
+        responses, unprocessed = {}, {}
+        with self._lock:
+            self.requests += 1
+            for name, request in RequestItems.items():
+                table = self.tables[name]
+                seen = set()
+                for key in request['Keys']:
+                    key_tuple = table._key(key)
+                    if key_tuple in seen:
+                        raise ClientError({'Error': {'Code': 'ValidationException',
+                                                     'Message': 'Provided list of item keys contains duplicates'}},
+                                          'BatchGetItem')
+                    seen.add(key_tuple)
+                    if self.throttle_rate and self._random.random() < self.throttle_rate:
+                        unprocessed.setdefault(name, {'Keys': []})['Keys'].append(key)
+                    elif key_tuple in table.items:
+                        responses.setdefault(name, []).append(dict(table.items[key_tuple]))
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        time.sleep(self.latency)
+        if len(TransactItems) > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Member must have length less than or equal to 100'}},
+                              'TransactWriteItems')
+        with self._lock:
+            self.requests += 1
+            reasons, writes, keys = [], [], set()
+            for action in TransactItems:
+                put = action['Put']
+                table = self.tables[put['TableName']]
+                key = (table.name, table._key(put['Item']))
+                if key in keys:
+                    raise ClientError({'Error': {'Code': 'ValidationException',
+                                                 'Message': 'Transaction request cannot include multiple operations on one item'}},
+                                      'TransactWriteItems')
+                keys.add(key)
+                # Only attribute_not_exists on the key is supported, i.e. "the item doesn't exist"
+                exists = put.get('ConditionExpression', '').startswith('attribute_not_exists') and key[1] in table.items
+                reasons.append({'Code': 'ConditionalCheckFailed' if exists else 'None'})
+                writes.append((table, put['Item']))
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise ClientError({'Error': {'Code': 'TransactionCanceledException',
+                                             'Message': 'Transaction cancelled'},
+                                   'CancellationReasons': reasons}, 'TransactWriteItems')
+            for table, item in writes:
+                table.items[table._key(item)] = dict(item)
+        return {}
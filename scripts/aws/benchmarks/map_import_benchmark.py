@@ -0,0 +1,96 @@
+"""Cold start of map-generation.py: folium imported at load (before) vs the precompiled template.
+
+Each run is a fresh interpreter started with ``-X importtime``, like a new Lambda
+container. It times the module init (importing the handler and everything it
+imports) and the first render of the full page with 1000 meters, and the
+``-X importtime`` report gives the modules that took longest to import.
+
+Run from this directory:  python map_import_benchmark.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+METERS = 1000
+TOP_MODULES = 8
+
+CHILD = """
+import time
+start = time.perf_counter()
+if {before!r}:
+    # What map-generation.py imported at module load before the template renderer
+    import folium
+    from branca.element import Figure, MacroElement
+    from folium import plugins
+from lambda_loader import load_lambda
+map_generation = load_lambda('map-generation')
+init = time.perf_counter() - start
+
+import random
+from map_shell_benchmark import StubS3, make_meters
+random.seed(0)
+meters = make_meters({meters})
+map_generation.s3 = StubS3()
+start = time.perf_counter()
+base, _ = map_generation.load_base_map()
+if map_generation.MAP_MODE == 'folium':
+    markers = map_generation.render_markers(base['layer'], meters)
+else:
+    markers = map_generation.map_template.render_markers(meters)
+page = base['head'] + markers + base['tail']
+render = time.perf_counter() - start
+print(json.dumps({{'init': init, 'render': render, 'size': len(page)}}))
+"""
+
+
+def parse_importtime(report):
+    """Top-level entries of a ``-X importtime`` report as ``{module: cumulative seconds}``."""
+    modules = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented two spaces per level
+        if name.startswith('  '):
+            continue
+        modules[name.strip()] = modules.get(name.strip(), 0) + int(cumulative) / 1e6
+    return modules
+
+
+def cold_start(before):
+    env = dict(os.environ, MAP_MODE='folium' if before else 'template', AWS_DEFAULT_REGION='us-west-1')
+    code = 'import json\n' + CHILD.format(before=before, meters=METERS)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+
+def main():
+    results = {}
+    for label, before in (('folium at load (before)', True), ('template (after)', False)):
+        runs = [cold_start(before) for _ in range(RUNS)]
+        results[label] = runs
+
+    print(f"median of {RUNS} cold starts, first render of {METERS} meters")
+    print(f"  {'':<26}{'init ms':>9}{'imports ms':>12}{'render ms':>11}{'page KB':>9}")
+    for label, runs in results.items():
+        init = statistics.median(timings['init'] for timings, _ in runs) * 1000
+        imports = statistics.median(sum(modules.values()) for _, modules in runs) * 1000
+        render = statistics.median(timings['render'] for timings, _ in runs) * 1000
+        size = runs[0][0]['size'] / 1024
+        print(f"  {label:<26}{init:9.1f}{imports:12.1f}{render:11.1f}{size:9.1f}")
+
+    for label, runs in results.items():
+        print(f"\n{label}: slowest top-level imports (-X importtime, cumulative)")
+        modules = {name: statistics.median(found.get(name, 0) for _, found in runs) for name in runs[0][1]}
+        for name, seconds in sorted(modules.items(), key=lambda entry: -entry[1])[:TOP_MODULES]:
+            print(f"  {name:<40}{seconds * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Full folium map page vs static shell plus marker data file, at 1k, 10k and 100k meters.
+
+Reports what each render uploads (raw and gzipped) and how long it takes to build.
+The folium render at 100k meters takes a few minutes.
+
+Run from this directory:  python map_shell_benchmark.py
+"""
+import gzip
+import io
+import os
+import random
+import time
+
+from lambda_loader import LAMBDAS_DIR, load_lambda
+
+METER_COUNTS = [1_000, 10_000, 100_000]
+BOUNDARIES = os.path.join(LAMBDAS_DIR, '..', 's3-bucket', 'data', 'crescenta_boundaries.geojson')
+
+
+class StubS3:
+    def get_object(self, Bucket, Key, **kwargs):
+        with open(BOUNDARIES, 'rb') as f:
+            return {'Body': io.BytesIO(f.read()), 'ETag': '"boundaries"'}
+
+
+def make_meters(n):
+    return [
+        {
+            'serialNumber': str(random.randint(10**9, 10**10 - 1)),
+            'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+            'timestamp': 1704067200 + i,
+            'coordinate': [round(random.uniform(34.20, 34.27), 10), round(random.uniform(-118.30, -118.20), 10)],
+        }
+        for i in range(n)
+    ]
+
+
+def sizes(body):
+    return f"{len(body) / 1024:10.1f} KB {len(gzip.compress(body)) / 1024:9.1f} KB gz"
+
+
+def main():
+    random.seed(0)
+    map_generation = load_lambda('map-generation')
+    map_generation.s3 = StubS3()
+    base, _ = map_generation.load_base_map()
+    shell = map_generation.render_shell(base, 'data').encode('utf-8')
+    print(f"static shell (uploaded once per boundaries version) {sizes(shell)}")
+
+    print(f"{'meters':>8}  {'mode':<14}{'build ms':>10}  {'uploaded per render':>32}")
+    for n in METER_COUNTS:
+        meters = make_meters(n)
+
+        start = time.perf_counter()
+        body = map_generation.encode_markers(meters)
+        data_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        page = (base['head'] + map_generation.render_markers(base['layer'], meters) + base['tail']).encode('utf-8')
+        folium_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{n:>8}  {'folium page':<14}{folium_ms:10.1f}  {sizes(page)}")
+        print(f"{n:>8}  {'marker data':<14}{data_ms:10.1f}  {sizes(body)}  ({folium_ms / data_ms:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Build and single-meter update cost of the map cluster tiles, at 1k, 10k and 100k meters.
+
+Run from this directory:  python marker_tiles_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from marker_tiles import MarkerTiles
+
+METER_COUNTS = [1_000, 10_000, 100_000]
+UPDATES = 200
+
+
+class StubS3:
+    def __init__(self):
+        self.puts = 0
+        self.bytes = 0
+        self.largest = 0
+
+    def get_object(self, Bucket, Key, **kwargs):
+        raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts += 1
+        self.bytes += len(Body)
+        if not Key.endswith('manifest.json'):
+            self.largest = max(self.largest, len(Body))
+        return {}
+
+    def delete_objects(self, **kwargs):
+        return {}
+
+
+def make_meter(serial):
+    return {
+        'serialNumber': serial,
+        'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+        'coordinate': [round(random.uniform(34.20, 34.27), 10), round(random.uniform(-118.30, -118.20), 10)],
+    }
+
+
+def main():
+    random.seed(0)
+    print(f"{'meters':>8}  {'build ms':>9}  {'tiles':>6}  {'total KB':>9}  {'largest KB':>10}  "
+          f"{'update ms':>9}  {'dirty':>5}  {'uploads':>7}")
+    for n in METER_COUNTS:
+        view = {str(i): make_meter(str(i)) for i in range(n)}
+        tiles = MarkerTiles()
+        s3 = StubS3()
+
+        start = time.perf_counter()
+        stats = tiles.publish(s3, 'bucket', tiles.update(view.values()))
+        build_ms = (time.perf_counter() - start) * 1000
+        total_kb, largest_kb = s3.bytes / 1024, s3.largest / 1024
+
+        # One meter gets a new reading (and moves) per render, as after a single stream event
+        s3 = StubS3()
+        dirty = 0
+        start = time.perf_counter()
+        for _ in range(UPDATES):
+            serial = str(random.randrange(n))
+            view[serial] = make_meter(serial)
+            changed = tiles.update(view.values())
+            dirty += len(changed)
+            tiles.publish(s3, 'bucket', changed)
+        update_ms = (time.perf_counter() - start) * 1000 / UPDATES
+
+        print(f"{n:>8}  {build_ms:9.1f}  {stats['tiles']:>6}  {total_kb:9.1f}  {largest_kb:10.1f}  "
+              f"{update_ms:9.2f}  {dirty / UPDATES:5.1f}  {s3.puts / UPDATES:7.1f}")
+    print("update ms includes diffing the whole view against the index; uploads include the manifest")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""MeterTable fan-out for one reference change: single query + sequential calls vs meter_fanout.
+
+Runs against the in-memory ``local_dynamodb.LocalTable`` with a simulated round-trip
+latency and 1000-item query pages, then again with a share of writes throttled.
+The baseline is the loop meter-reference-stream-handler.py used before: it only
+sees the first query page, so readings beyond it are left untouched, and a
+write still throttled after the client's retries aborts the rest of the meter. The
+stand-in retries throttled writes the way the SDK does, up to aws_runtime's default
+AWS_MAX_ATTEMPTS; the fan-out has no retry layer of its own on top.
+
+Run from this directory:  python meter_fanout_benchmark.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from boto3.dynamodb.conditions import Key
+
+import meter_fanout
+from local_dynamodb import LocalTable
+
+HISTORIES = (100, 1000, 5000)
+LATENCY = 0.002
+THROTTLE_RATE = 0.02
+SERIAL = '2005993218'
+# aws_runtime's default AWS_MAX_ATTEMPTS
+SDK_ATTEMPTS = 5
+
+
+def table_with_history(readings, throttle_rate):
+    table = LocalTable('WaterMeterTable', ('serialNumber', 'timestamp'), latency=LATENCY, throttle_rate=throttle_rate,
+                       max_attempts=SDK_ATTEMPTS)
+    table.load({'serialNumber': SERIAL, 'timestamp': 1700000000 + i * 3600, 'meterValue': i,
+                'zipcode': '91214', 'coordinate': [34.2, -118.2]} for i in range(readings))
+    return table
+
+
+def update_sequential(table):
+    # Baseline: one query page, one update_item at a time, throttling errors abort
+    response = table.query(KeyConditionExpression=Key('serialNumber').eq(SERIAL))
+    for item in response.get('Items', []):
+        table.update_item(
+            Key={'serialNumber': item['serialNumber'], 'timestamp': item['timestamp']},
+            UpdateExpression="SET zipcode = :zip, coordinate = :coord",
+            ExpressionAttributeValues={':zip': '91020', ':coord': [34.25, -118.25]}
+        )
+
+
+def delete_sequential(table):
+    response = table.query(KeyConditionExpression=Key('serialNumber').eq(SERIAL))
+    for item in response.get('Items', []):
+        table.delete_item(Key={'serialNumber': item['serialNumber'], 'timestamp': item['timestamp']})
+
+
+def run(fn, table):
+    start = time.perf_counter()
+    try:
+        fn(table)
+        error = ''
+    except Exception as e:
+        error = type(e).__name__ if not hasattr(e, 'response') else e.response['Error']['Code']
+    return time.perf_counter() - start, error
+
+
+def report(label, readings, seconds, done, table, error=''):
+    rate = done / seconds if seconds else 0
+    note = f"  stopped: {error}" if error else ''
+    print(f"  {label:<28}{seconds:8.2f} s{done:>7}/{readings:<6}{rate:8.0f} items/s{table.requests:>7} requests{note}")
+
+
+def compare(readings, throttle_rate):
+
+        table = table_with_history(readings, throttle_rate)
+        seconds, error = run(update_sequential, table)
+        done = sum(1 for item in table.items.values() if item['zipcode'] == '91020')
+        report('MODIFY sequential', readings, seconds, done, table, error)
+
+        table = table_with_history(readings, throttle_rate)
+        stats = meter_fanout.update_history(table, SERIAL, '91020', [34.25, -118.25])
+        done = sum(1 for item in table.items.values() if item['zipcode'] == '91020')
+        assert done == stats.items == readings - stats.failed, (done, stats.items, stats.failed)
+        report('MODIFY fan-out', readings, stats.seconds, done, table)
+
+        table = table_with_history(readings, throttle_rate)
+        seconds, error = run(delete_sequential, table)
+        report('REMOVE sequential', readings, seconds, readings - len(table.items), table, error)
+
+        table = table_with_history(readings, throttle_rate)
+        stats = meter_fanout.delete_history(table, SERIAL)
+        assert not table.items and stats.items == readings
+        report('REMOVE batch writer', readings, stats.seconds, readings, table)
+
+
+def main():
+    print(f"simulated latency {LATENCY * 1000:.0f} ms/request, {meter_fanout.UPDATE_WORKERS} update workers")
+    for throttle_rate in (0.0, THROTTLE_RATE):
+        for readings in HISTORIES:
+            print(f"\n{readings} readings for one meter, {throttle_rate:.0%} of writes throttled")
+            compare(readings, throttle_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Reference lookups in water-meter-data-insertion: get_item per submission vs the warm-container TTL cache.
+
+Simulates a working day of route readings on a virtual clock: each technician
+walks the same route over and over, some readings are resubmitted as
+corrections, a few carry mistyped serial numbers, and the reference set changes
+(bumping the version marker) a few times. It runs once at a sparse rate (one
+submission every 4s overall) and once at a busy one (five per second).
+Submissions are spread over one or more warm containers, each with its own
+cache. Latency is modeled from request counts using typical in-region
+round-trip times, so the version checks before serving a hit are included.
+
+Run from this directory:  python reference_cache_benchmark.py
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from ttl_cache import TTLCache
+
+GET_ITEM_MS = 6.0
+HEAD_OBJECT_MS = 15.0
+CACHE_HIT_MS = 0.01
+
+TECHNICIANS = 20
+ROUTE_METERS = 50
+DAY_SECONDS = 8 * 3600
+RATES = (('sparse', 4.0), ('busy', 0.2))
+CORRECTION_RATE = 0.05
+TYPO_RATE = 0.02
+REFERENCE_CHANGES = 4
+
+NEGATIVE_TTL_SECONDS = 30
+VERSION_CHECK_SECONDS = 60
+
+
+def workload(submit_every):
+    random.seed(0)
+    routes = [[str(random.randint(10**9, 10**10 - 1)) for _ in range(ROUTE_METERS)] for _ in range(TECHNICIANS)]
+    positions = [0] * TECHNICIANS
+    submissions = []
+    for step in range(int(DAY_SECONDS / submit_every)):
+        now = step * submit_every
+        tech = random.randrange(TECHNICIANS)
+        if random.random() >= CORRECTION_RATE:
+            positions[tech] += 1
+        serial = routes[tech][positions[tech] % ROUTE_METERS]
+        if random.random() < TYPO_RATE:
+            serial = serial[:-1] + 'x'
+        submissions.append((now, serial))
+    changes = sorted(random.uniform(0, DAY_SECONDS) for _ in range(REFERENCE_CHANGES))
+    return submissions, changes
+
+
+def simulate(submissions, changes, containers, ttl):
+    now = 0.0
+    caches = [TTLCache(10000, ttl, NEGATIVE_TTL_SECONDS, clock=lambda: now) for _ in range(containers)]
+    seen_version = [0] * containers
+    checked_at = [None] * containers
+    get_items = heads = 0
+    total_ms = 0.0
+
+    for i, (now, serial) in enumerate(submissions):
+        c = i % containers
+        total_ms += CACHE_HIT_MS
+        if serial in caches[c] and (checked_at[c] is None or now - checked_at[c] >= VERSION_CHECK_SECONDS):
+            checked_at[c] = now
+            heads += 1
+            total_ms += HEAD_OBJECT_MS
+            version = sum(1 for t in changes if t <= now)
+            if version != seen_version[c]:
+                seen_version[c] = version
+                caches[c].clear()
+        hit, _ = caches[c].get(serial)
+        if not hit:
+            get_items += 1
+            total_ms += GET_ITEM_MS
+            caches[c].put(serial, None if serial.endswith('x') else {'serialNumber': serial})
+
+    hits = sum(cache.hits for cache in caches)
+    return hits / len(submissions), get_items, heads, total_ms / len(submissions)
+
+
+def main():
+    print(f"{TECHNICIANS} technicians on {ROUTE_METERS}-meter routes for {DAY_SECONDS // 3600} h, "
+          f"{REFERENCE_CHANGES} reference changes")
+    print(f"modeled latency: get_item {GET_ITEM_MS} ms, version check {HEAD_OBJECT_MS} ms "
+          f"(at most every {VERSION_CHECK_SECONDS}s per container)")
+    for name, submit_every in RATES:
+        submissions, changes = workload(submit_every)
+        print(f"\n{name}: {len(submissions)} submissions, one every {submit_every}s")
+        print(f"  {'':<30}{'hit rate':>9}{'get_item':>10}{'checks':>8}{'mean lookup':>13}")
+        print(f"  {'get_item per submission':<30}{0:>9.0%}{len(submissions):>10}{0:>8}{GET_ITEM_MS:>10.2f} ms")
+        for ttl in (300, 3600):
+            for containers in (1, 4):
+                rate, get_items, heads, mean = simulate(submissions, changes, containers, ttl)
+                label = f"cache, ttl {ttl}s, {containers} container{'s' if containers > 1 else ''}"
+                print(f"  {label:<30}{rate:>9.0%}{get_items:>10}{heads:>8}{mean:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Stream batches against reference.json at 100k registered meters: list scans vs the serial index.
+
+Each batch is a mix of INSERT, MODIFY and REMOVE records applied the way
+meter-reference-stream-handler.py applies them, including loading the parsed
+reference.json and producing the list that is written back.
+
+Run from this directory:  python reference_index_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from reference_index import ReferenceIndex
+
+METERS = 100_000
+BATCH_SIZES = (10, 100, 1000)
+
+
+def meter(serial_number):
+    return {
+        'serialNumber': serial_number,
+        'zipcode': random.choice(['91011', '91020', '91214']),
+        'coordinate': [round(random.uniform(34.19, 34.28), 10), round(random.uniform(-118.28, -118.19), 10)],
+    }
+
+
+def make_batch(serials, size):
+    records = []
+    for _ in range(size):
+        kind = random.choice(['INSERT', 'MODIFY', 'REMOVE'])
+        if kind == 'INSERT':
+            records.append((kind, meter(str(random.randint(10**10, 10**11)))))
+        else:
+            records.append((kind, meter(random.choice(serials))))
+    return records
+
+
+def apply_list(data, records):
+    # Baseline: the list operations meter-reference-stream-handler.py started with
+    data = list(data)
+    for kind, item in records:
+        serial_number = item['serialNumber']
+        if kind == 'INSERT':
+            existing = next((row for row in data if row['serialNumber'] == serial_number), None)
+            if not existing:
+                data.append(item)
+        elif kind == 'REMOVE':
+            data = [row for row in data if row['serialNumber'] != serial_number]
+        else:
+            data = [item if row['serialNumber'] == serial_number else row for row in data]
+    return data
+
+
+def apply_index(data, records):
+    meters = ReferenceIndex.from_list(data)
+    for kind, item in records:
+        if kind == 'INSERT':
+            meters.insert(item)
+        elif kind == 'REMOVE':
+            meters.remove(item['serialNumber'])
+        else:
+            meters.replace(item)
+    return meters.to_list()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    random.seed(0)
+    data = [meter(str(serial)) for serial in random.sample(range(10**9, 10**10), METERS)]
+    serials = [item['serialNumber'] for item in data]
+
+    print(f"{METERS} registered meters")
+    print(f"  {'records':>8}{'list scans':>14}{'serial index':>15}{'speedup':>9}")
+    for size in BATCH_SIZES:
+        records = make_batch(serials, size)
+        list_time, expected = timed(lambda: apply_list(data, records))
+        index_time, result = timed(lambda: apply_index(data, records))
+        assert result == expected
+        print(f"  {size:>8}{list_time * 1000:11.1f} ms{index_time * 1000:12.1f} ms{list_time / index_time:8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
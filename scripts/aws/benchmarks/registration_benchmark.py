@@ -0,0 +1,106 @@
+"""Meter registration: existence check + two puts vs one conditional transaction vs bulk onboarding.
+
+Runs against the in-memory ``local_dynamodb`` stand-in with a simulated
+DynamoDB round-trip. The baseline is the flow water-meter-registeration.py
+used before (get_item, then put_item into each table). The bulk run imports an
+asset list, in requests of at most BULK_MAX_METERS, in which a few meters are
+already registered.
+
+Run from this directory:  python registration_benchmark.py
+"""
+import contextlib
+import io
+import json
+import random
+import time
+
+from lambda_loader import load_lambda
+from local_dynamodb import LocalDynamoDB
+
+DYNAMODB_LATENCY = 0.005
+METERS = (100, 1000, 5000)
+ALREADY_REGISTERED = 0.02
+
+
+def asset_list(count):
+    return [
+        {
+            'serialNumber': str(serial),
+            'zipcode': random.choice(['91011', '91020', '91214']),
+            'coordinate': [round(random.uniform(34.19, 34.28), 10), round(random.uniform(-118.28, -118.19), 10)],
+            'meterValue': round(random.uniform(1000, 8000), 2),
+            'date': '2025-06-01',
+        }
+        for serial in random.sample(range(10**9, 10**10), count)
+    ]
+
+
+def setup(registration):
+    db = LocalDynamoDB(latency=DYNAMODB_LATENCY)
+    registration.dynamodb = db
+    registration.reference_table = db.create_table('MeterReferenceTable', ('serialNumber',))
+    registration.meter_table = db.create_table('WaterMeterTable', ('serialNumber', 'timestamp'))
+    return db
+
+
+def requests_made(db):
+    return db.requests + sum(table.requests for table in db.tables.values())
+
+
+def register_before(registration, body):
+    # Baseline: existence check, then one put per table
+    existing = registration.reference_table.get_item(Key={'serialNumber': body['serialNumber']})
+    if 'Item' in existing:
+        return 409
+    item, reference_item, _ = registration.build_items(body)
+    registration.reference_table.put_item(Item=reference_item)
+    registration.meter_table.put_item(Item=item)
+    return 200
+
+
+def report(label, count, seconds, db):
+    print(f"  {count:>6}  {label:<26}{seconds:8.2f} s{count / seconds:9.0f} meters/s{requests_made(db):>8} requests")
+
+
+def main():
+    random.seed(0)
+    registration = load_lambda('water-meter-registeration')
+    print(f"simulated DynamoDB round-trip {DYNAMODB_LATENCY * 1000:.0f} ms")
+    for count in METERS:
+        meters = asset_list(count)
+        preexisting = random.sample(meters, int(count * ALREADY_REGISTERED))
+
+        if count <= 1000:
+            db = setup(registration)
+            start = time.perf_counter()
+            statuses = [register_before(registration, meter) for meter in meters]
+            report('check + 2 puts', count, time.perf_counter() - start, db)
+            assert statuses == [200] * count
+
+            db = setup(registration)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                statuses = [registration.lambda_handler({'body': json.dumps(meter)}, None)['statusCode']
+                            for meter in meters]
+            report('transaction per request', count, time.perf_counter() - start, db)
+            assert statuses == [200] * count
+
+        db = setup(registration)
+        for meter in preexisting:
+            registration.register(*registration.build_items(meter)[:2])
+        db.requests = 0
+        start = time.perf_counter()
+        results = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(0, count, registration.BULK_MAX_METERS):
+                request = {'meters': meters[i:i + registration.BULK_MAX_METERS]}
+                response = registration.lambda_handler({'body': json.dumps(request)}, None)
+                results.extend(json.loads(response['body'])['results'])
+        seconds = time.perf_counter() - start
+        assert sum(1 for result in results if result['status'] == 'registered') == count - len(preexisting)
+        assert sum(1 for result in results if result['status'] == 'exists') == len(preexisting)
+        report(f"bulk ({len(preexisting)} already exist)", count, seconds, db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Per-event cost of df-updater's list scans vs the uuid-indexed SnapshotStore.
+
+Run from this directory:  python snapshot_store_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas'))
+
+from snapshot_store import SnapshotStore
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def make_readings(n, meters):
+    serials = [str(1_000_000_000 + i) for i in range(meters)]
+    return [
+        {
+            'uuid': str(uuid.uuid4()),
+            'serialNumber': random.choice(serials),
+            'meterValue': round(random.uniform(1000.0, 8000.0), 2),
+            'zipcode': '91214',
+            'date': '2024-06-24',
+            'timestamp': 1704067200 + i,
+            'coordinate': [34.2367516755, -118.2374021576],
+        }
+        for i in range(n)
+    ]
+
+
+def per_event_us(fn, events):
+    start = time.perf_counter()
+    for event in events:
+        fn(event)
+    return (time.perf_counter() - start) / len(events) * 1e6
+
+
+def bench_list(data, targets):
+    state = {'data': data}
+
+    def modify(item):
+        uid = item['uuid']
+        state['data'] = [x if x['uuid'] != uid else item for x in state['data']]
+
+    def remove(item):
+        uid = item['uuid']
+        state['data'] = [x for x in state['data'] if x['uuid'] != uid]
+
+    return per_event_us(modify, targets), per_event_us(remove, targets)
+
+
+def bench_store(store, targets):
+    def modify(item):
+        store.replace(item)
+
+    def remove(item):
+        store.delete(item['uuid'])
+
+    return per_event_us(modify, targets), per_event_us(remove, targets)
+
+
+def main():
+    random.seed(0)
+    print(f"{'readings':>10} {'impl':>6} {'MODIFY us/event':>16} {'REMOVE us/event':>16}")
+    for n in SIZES:
+        data = make_readings(n, meters=max(n // 40, 1))
+        # The list scan is O(n) per event, so keep the sample small at 1M readings
+        events = 200 if n <= 100_000 else 20
+        targets = [dict(item, meterValue=1.0) for item in random.sample(data, events)]
+
+        store = SnapshotStore.from_list(data)
+        store_modify, store_remove = bench_store(store, targets)
+        list_modify, list_remove = bench_list(list(data), targets)
+
+        print(f"{n:>10} {'list':>6} {list_modify:>16.1f} {list_remove:>16.1f}")
+        print(f"{n:>10} {'store':>6} {store_modify:>16.2f} {store_remove:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""stream-handler invocation latency vs SQS batch size, against a stubbed SQS client.
+
+Each stubbed call sleeps for a fixed round-trip time, so the numbers show how the
+number of sequential SQS calls drives invocation latency.
+
+Run from this directory:  python stream_handler_benchmark.py
+"""
+import functools
+import random
+import time
+
+from lambda_loader import load_lambda
+
+import sqs_batch
+
+RECORDS = 100
+ROUND_TRIP_SECONDS = 0.015
+BATCH_SIZES = [1, 2, 5, 10]
+
+
+class StubSQS:
+    """Stubbed SQS; a batch entry fails with ``failure_rate`` and takes every entry after it
+    with it, or with ``fail_after_success`` only the first entry of the first batch fails."""
+
+    def __init__(self, failure_rate=0.0, fail_after_success=False):
+        self.calls = 0
+        self.failure_rate = failure_rate
+        self.fail_after_success = fail_after_success
+        self.bodies = []
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.calls += 1
+        time.sleep(ROUND_TRIP_SECONDS)
+        self.bodies.append(MessageBody)
+        return {}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls += 1
+        time.sleep(ROUND_TRIP_SECONDS)
+        first_failure = next((i for i in range(len(Entries)) if random.random() < self.failure_rate), len(Entries))
+        if self.fail_after_success and self.calls == 1:
+            failing = Entries[:1]
+        else:
+            failing = Entries[first_failure:]
+        failed = [{'Id': e['Id'], 'SenderFault': False, 'Code': 'InternalError'} for e in failing]
+        failed_ids = {f['Id'] for f in failed}
+        self.bodies.extend(e['MessageBody'] for e in Entries if e['Id'] not in failed_ids)
+        return {'Successful': [{'Id': e['Id']} for e in Entries if e['Id'] not in failed_ids], 'Failed': failed}
+
+
+def make_event(n):
+    records = []
+    for i in range(n):
+        image = {
+            'uuid': {'S': f'uuid-{i}'},
+            'serialNumber': {'S': str(1_000_000_000 + i)},
+            'meterValue': {'N': '1375.56'},
+            'zipcode': {'S': '91214'},
+            'date': {'S': '2024-06-24'},
+            'timestamp': {'N': str(1719212400 + i)},
+            'coordinate': {'L': [{'N': '34.2367516755'}, {'N': '-118.2374021576'}]},
+        }
+        keys = {'serialNumber': image['serialNumber'], 'timestamp': image['timestamp']}
+        records.append({'eventID': f'event-{i}', 'eventName': 'INSERT', 'dynamodb': {'Keys': keys, 'NewImage': image}})
+    return {'Records': records}
+
+
+def invoke(handler, event, sqs, batch_size):
+    handler.sqs = sqs
+    handler.send_batched = functools.partial(sqs_batch.send_batched, max_entries=batch_size)
+    start = time.perf_counter()
+    result = handler.lambda_handler(event, None)
+    assert result['statusCode'] == 200, result
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    random.seed(0)
+    handler = load_lambda('stream-handler')
+    event = make_event(RECORDS)
+    print(f"{RECORDS} stream records, {ROUND_TRIP_SECONDS * 1000:.0f} ms per SQS call")
+    print(f"{'batch size':>10} {'SQS calls':>10} {'latency ms':>11} {'with 5% entry failures':>23}")
+    for size in BATCH_SIZES:
+        sqs = StubSQS()
+        latency = invoke(handler, event, sqs, size)
+        flaky = StubSQS(failure_rate=0.05)
+        flaky_latency = invoke(handler, event, flaky, size)
+        # Failed tails are retried, so every message still arrives once and in order
+        assert flaky.bodies == sqs.bodies
+        print(f"{size:>10} {sqs.calls:>10} {latency:>11.1f} {flaky_latency:>17.1f} ({flaky.calls} calls)")
+
+    # An entry failing ahead of one that was sent can't be resent in order: the
+    # invocation fails so the stream batch is retried
+    try:
+        invoke(handler, event, StubSQS(fail_after_success=True), BATCH_SIZES[-1])
+    except sqs_batch.BatchSendError as e:
+        print(f"failure ahead of a sent entry: invocation failed for a retry ({e})")
+    else:
+        raise AssertionError("expected BatchSendError")
+
+
+if __name__ == '__main__':
+    main()
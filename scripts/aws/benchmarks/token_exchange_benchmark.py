@@ -0,0 +1,102 @@
+"""Login latency of toke-exchange-lambda.py: urlopen per login (before) vs the kept-alive connection.
+
+Runs both handlers against the local Cognito token endpoint (local_cognito.py)
+over real TLS, one authorization code exchange per simulated login, then times
+refresh_token grants and logins that arrive after the endpoint has dropped the
+idle connection, which the handler reconnects through.
+
+Run from this directory:  python token_exchange_benchmark.py
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+from lambda_loader import load_lambda
+from local_cognito import LocalCognito
+
+LOGINS = 200
+REFRESHES = 200
+IDLE_LOGINS = 10
+SERVER_LATENCY = 0.005
+IDLE_TIMEOUT = 0.2
+
+CLIENT_ID = 'benchmark-client'
+CLIENT_SECRET = 'benchmark-secret'
+REDIRECT_URI = 'https://d27us82d2go2e4.cloudfront.net/'
+
+
+def urlopen_handler(event, context):
+    # Baseline: the token exchange as it was in toke-exchange-lambda.py
+    body = json.loads(event['body'])
+    token_url = f"https://{os.environ['COGNITO_DOMAIN']}/oauth2/token"
+    data = urllib.parse.urlencode({
+        'grant_type': 'authorization_code',
+        'client_id': CLIENT_ID,
+        'client_secret': CLIENT_SECRET,
+        'code': body['code'],
+        'redirect_uri': REDIRECT_URI
+    }).encode('ascii')
+    req = urllib.request.Request(token_url, data=data, headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                                 method='POST')
+    response = urllib.request.urlopen(req)
+    return {'statusCode': 200, 'body': json.dumps(json.loads(response.read().decode('utf-8')))}
+
+
+def invoke(handler, body):
+    start = time.perf_counter()
+    response = handler({'body': json.dumps(body)}, None)
+    elapsed = time.perf_counter() - start
+    assert response['statusCode'] == 200, response
+    return elapsed, json.loads(response['body'])
+
+
+def run(cognito, label, handler, bodies, pause=0.0):
+    connections, timings, tokens = cognito.connections, [], None
+    for body in bodies:
+        time.sleep(pause)
+        elapsed, tokens = invoke(handler, body())
+        timings.append(elapsed)
+    opened = cognito.connections - connections
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    print(f"  {label:<40}{statistics.median(timings) * 1000:9.2f} ms{p95 * 1000:9.2f} ms"
+          f"{opened:>6} connections for {len(timings)}")
+    return tokens
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        cognito = LocalCognito(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, latency=SERVER_LATENCY)
+        os.environ['SSL_CERT_FILE'] = cognito.start(workdir)
+        os.environ.update(COGNITO_DOMAIN=cognito.domain, CLIENT_ID=CLIENT_ID, CLIENT_SECRET=CLIENT_SECRET,
+                          REDIRECT_URI=REDIRECT_URI)
+        token_exchange = load_lambda('toke-exchange-lambda')
+        login = lambda: {'code': cognito.authorize()}
+
+        print(f"local HTTPS token endpoint, {SERVER_LATENCY * 1000:.0f} ms per request")
+        print(f"  {'':<40}{'median':>12}{'p95':>12}")
+        run(cognito, 'urlopen per login (before)', urlopen_handler, [login] * LOGINS)
+        tokens = run(cognito, 'kept-alive connection', token_exchange.lambda_handler, [login] * LOGINS)
+        refresh = lambda: {'refresh_token': tokens['refresh_token']}
+        run(cognito, 'refresh_token grant, kept alive', token_exchange.lambda_handler, [refresh] * REFRESHES)
+
+        # Logins further apart than the endpoint keeps idle connections open
+        cognito.idle_timeout = IDLE_TIMEOUT
+        token_exchange.close()
+        run(cognito, f'logins {IDLE_TIMEOUT * 2:.1f}s apart, idle drop at {IDLE_TIMEOUT:.1f}s', token_exchange.lambda_handler,
+            [login] * IDLE_LOGINS, pause=IDLE_TIMEOUT * 2)
+        run(cognito, 'urlopen, same spacing (before)', urlopen_handler, [login] * IDLE_LOGINS, pause=IDLE_TIMEOUT * 2)
+
+        # Codes are single-use: a replayed one comes back as Cognito's 400, not a 500
+        code = cognito.authorize()
+        invoke(token_exchange.lambda_handler, {'code': code})
+        replay = token_exchange.lambda_handler({'body': json.dumps({'code': code})}, None)
+        print(f"\nreplayed code: {replay['statusCode']} {replay['body']}")
+        cognito.stop()
+
+
+if __name__ == '__main__':
+    main()
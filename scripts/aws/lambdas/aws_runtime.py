@@ -0,0 +1,54 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Shared by every client and resource:
+# - enough pooled connections for the concurrent fan-out workers (meter_fanout)
+# - TCP keep-alive, so pooled connections stay usable across warm invocations
+# - adaptive retries, which back off and rate-limit the client while it is throttled
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 32)),
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'total_max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 5))},
+)
+
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+# boto3 sessions aren't safe to create clients from concurrently
+_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def client(service):
+    """boto3 client for ``service``, created on first use and reused by the whole container."""
+    if service not in _clients:
+        with _lock:
+            if service not in _clients:
+                _clients[service] = _get_session().client(service, config=CLIENT_CONFIG)
+    return _clients[service]
+
+
+def resource(service):
+    """boto3 service resource, created on first use and reused by the whole container."""
+    if service not in _resources:
+        with _lock:
+            if service not in _resources:
+                _resources[service] = _get_session().resource(service, config=CLIENT_CONFIG)
+    return _resources[service]
+
+
+def table(name):
+    """DynamoDB Table on the shared resource; its calls go through the shared pooled client."""
+    if name not in _tables:
+        _tables[name] = resource('dynamodb').Table(name)
+    return _tables[name]
@@ -0,0 +1,232 @@
+import gzip
+import json
+import math
+from decimal import Decimal
+
+import decimal_json
+
+FORMAT = 'water-meter-columnar'
+VERSION = 2
+# Version 1 stored timestamps as whole seconds and used fixed precisions; still readable
+READABLE_VERSIONS = (1, 2)
+
+# Most decimal places a float column is scaled by (coordinates in df.json have 10)
+MAX_PRECISION = 12
+
+# Fields stored as columns; anything else on a reading goes to the sparse "extra" column
+INTERNED_FIELDS = ('serialNumber', 'zipcode', 'date')
+FIELDS = ('uuid', 'meterValue', 'timestamp', 'coordinate') + INTERNED_FIELDS
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def dumps(items, compress=False, meter_value_precision=None, coordinate_precision=None,
+          timestamp_precision=None):
+    """Encode df.json readings as parallel arrays.
+
+    ``serialNumber``, ``zipcode`` and ``date`` are interned into a value table plus an
+    index column. ``meterValue``, ``timestamp`` and ``coordinate`` become integer
+    columns: int columns as they are, float columns scaled by ``10 ** precision``.
+    Each column's type is the one most of its readings have, and its precision is
+    the fewest decimal places (up to MAX_PRECISION) that fit its readings, unless given.
+
+    Decoding gives back the same values as the readings, including int vs float:
+    a reading whose value the column can't reproduce exactly (the other type, more
+    decimal places, not a number) keeps its original value in the sparse "extra"
+    column instead. The header (``format``/``version``) lets readers tell it apart
+    from the plain list format. Returns bytes, gzip-compressed when ``compress`` is set.
+    """
+    uuids, values, timestamps, lats, lons, extra = [], [], [], [], [], []
+    tables = {field: {} for field in INTERNED_FIELDS}
+    indexes = {field: [] for field in INTERNED_FIELDS}
+
+    for item in items:
+        uuids.append(item.get('uuid'))
+        value = item.get('meterValue')
+        values.append(_plain(value) if type(value) is Decimal else value)
+        timestamp = item.get('timestamp')
+        timestamps.append(_plain(timestamp) if type(timestamp) is Decimal else timestamp)
+        coord = item.get('coordinate')
+        if isinstance(coord, (list, tuple)) and len(coord) == 2:
+            lat, lon = coord
+            lats.append(_plain(lat) if type(lat) is Decimal else lat)
+            lons.append(_plain(lon) if type(lon) is Decimal else lon)
+        else:
+            lats.append(None)
+            lons.append(None)
+
+        for field in INTERNED_FIELDS:
+            table = tables[field]
+            value = item.get(field)
+            # Keyed by type too: 1, 1.0 and True are equal dict keys but encode differently
+            key = (type(value), value)
+            if key not in table:
+                table[key] = len(table)
+            indexes[field].append(table[key])
+
+    types, precision, columns = {}, {}, {'uuid': uuids}
+    types['meterValue'], precision['meterValue'], columns['meterValue'] = \
+        _number_column(values, meter_value_precision)
+    types['timestamp'], precision['timestamp'], columns['timestamp'] = \
+        _number_column(timestamps, timestamp_precision)
+    # Latitude and longitude share a type and precision
+    types['coordinate'], precision['coordinate'], coords = _number_column(lats + lons, coordinate_precision)
+    lats, lons = coords[:len(lats)], coords[len(lats):]
+    for row, (lat, lon) in enumerate(zip(lats, lons)):
+        if (lat is None) != (lon is None):
+            lats[row] = lons[row] = None
+    columns['lat'], columns['lon'] = lats, lons
+
+    exact = {'meterValue': columns['meterValue'], 'timestamp': columns['timestamp'], 'coordinate': lats}
+    for row, item in enumerate(items):
+        # Anything the columns don't reproduce exactly, including explicit nulls
+        other = {k: v for k, v in item.items() if k not in FIELDS}
+        for field, column in exact.items():
+            if column[row] is None and field in item:
+                other[field] = item[field]
+        for field in INTERNED_FIELDS:
+            if field in item and item[field] is None:
+                other[field] = None
+        if other:
+            extra.append([row, other])
+
+    for field in INTERNED_FIELDS:
+        columns[field] = {'values': [value for _, value in tables[field]], 'index': indexes[field]}
+
+    document = {
+        'format': FORMAT,
+        'version': VERSION,
+        'count': len(uuids),
+        'types': types,
+        'precision': precision,
+        'columns': columns,
+        'extra': extra,
+    }
+    raw = decimal_json.dumps(document, compact=True).encode('utf-8')
+    return gzip.compress(raw, compresslevel=6) if compress else raw
+
+
+def loads(raw):
+    """Decode a snapshot in either format: the df.json list of readings or columnar.
+
+    Accepts str or bytes, gzip-compressed or not, and always returns a list of dicts.
+    """
+    if isinstance(raw, bytes):
+        if raw[:2] == GZIP_MAGIC:
+            raw = gzip.decompress(raw)
+        raw = raw.decode('utf-8')
+    document = json.loads(raw)
+
+    if isinstance(document, list):
+        return document
+    if not isinstance(document, dict) or document.get('format') != FORMAT:
+        raise ValueError('Unrecognized snapshot format')
+    if document.get('version') not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported {FORMAT} version: {document.get('version')}")
+    return _decode_columns(document)
+
+
+def _decode_columns(document):
+    columns = document['columns']
+    precision = document['precision']
+    types = document.get('types', {'meterValue': 'float', 'timestamp': 'int', 'coordinate': 'float'})
+    precision.setdefault('timestamp', 0)
+
+    uuids = columns['uuid']
+    values = _decode_numbers(columns['meterValue'], types['meterValue'], precision['meterValue'])
+    timestamps = _decode_numbers(columns['timestamp'], types['timestamp'], precision['timestamp'])
+    lats = _decode_numbers(columns['lat'], types['coordinate'], precision['coordinate'])
+    lons = _decode_numbers(columns['lon'], types['coordinate'], precision['coordinate'])
+    interned = [(field, columns[field]['values'], columns[field]['index']) for field in INTERNED_FIELDS]
+    (_, serials, serial_index), (_, zipcodes, zipcode_index), (_, dates, date_index) = interned
+
+    complete = not any(None in column for column in (values, timestamps, lats, serials, zipcodes, dates))
+    if complete:
+        items = [
+            {
+                'uuid': u,
+                'meterValue': v,
+                'timestamp': t,
+                'coordinate': [lat, lon],
+                'serialNumber': serials[s],
+                'zipcode': zipcodes[z],
+                'date': dates[d],
+            }
+            for u, v, t, lat, lon, s, z, d in zip(
+                uuids, values, timestamps, lats, lons, serial_index, zipcode_index, date_index)
+        ]
+    else:
+        items = []
+        for row in range(document['count']):
+            item = {'uuid': uuids[row]}
+            if values[row] is not None:
+                item['meterValue'] = values[row]
+            if timestamps[row] is not None:
+                item['timestamp'] = timestamps[row]
+            if lats[row] is not None and lons[row] is not None:
+                item['coordinate'] = [lats[row], lons[row]]
+            for field, table, index in interned:
+                if table[index[row]] is not None:
+                    item[field] = table[index[row]]
+            items.append(item)
+
+    for row, other in document.get('extra', []):
+        items[row].update(other)
+    return items
+
+
+def _plain(value):
+    """The int or float a number reads back as from df.json (Decimals as decimal_json writes them)."""
+    if isinstance(value, Decimal) and value.is_finite():
+        return json.loads(decimal_json.dumps(value))
+    return value
+
+
+def _number_column(values, precision=None):
+    """``(type, precision, column)`` for a numeric field; the column has None for values it
+    can't reproduce exactly. Without a ``precision``, float columns use the fewest
+    decimal places, up to MAX_PRECISION, that fit their values.
+    """
+    ints = sum(1 for v in values if type(v) is int)
+    floats = sum(1 for v in values if type(v) is float)
+    if ints > floats:
+        return 'int', 0, [v if type(v) is int else None for v in values]
+
+    fixed = precision is not None
+    precision = precision or 0
+    scale = 10 ** precision
+    column = []
+    for v in values:
+        scaled = _scaled(v, scale)
+        if scaled is None and not fixed and type(v) is float:
+            # Widen the column to the places this value needs, rescaling the values before it
+            for places in range(precision + 1, MAX_PRECISION + 1):
+                scaled = _scaled(v, 10 ** places)
+                if scaled is not None:
+                    factor = 10 ** (places - precision)
+                    column = [None if c is None else c * factor for c in column]
+                    precision, scale = places, 10 ** places
+                    break
+        column.append(scaled)
+    return 'float', precision, column
+
+
+def _scaled(v, scale):
+    """``v * scale`` as an integer if dividing it by ``scale`` gives back exactly ``v``, else None."""
+    if type(v) is not float:
+        return None
+    try:
+        scaled = round(v * scale)
+    except (OverflowError, ValueError):
+        return None
+    # Same float back, sign of zero included (float noise like 34.183051592300004 never is)
+    if scaled / scale != v or (scaled == 0 and math.copysign(1, v) < 0):
+        return None
+    return scaled
+
+
+def _decode_numbers(column, column_type, precision):
+    if column_type == 'int':
+        return column
+    scale = 10 ** precision
+    return [None if v is None else v / scale for v in column]
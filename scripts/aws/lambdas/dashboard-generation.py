@@ -1,50 +1,40 @@
+import io
 import json
-import boto3
+import os
 import datetime
+from html import escape
+from array import array
+from bisect import bisect_right
+from fingerprint import FINGERPRINT, fingerprint, published_fingerprint
+from debounce import Debouncer, debounced_readings
+import aws_runtime
 
-def lambda_handler(event, context):
-    try:
-        s3 = boto3.client('s3')
-        bucket_name = 'water-meter-s3-bucket'
-        file_name = 'meter_dashboard.html'
+s3 = aws_runtime.client('s3')
+sqs = aws_runtime.client('sqs')
 
-        for record in event['Records']:
-            body = json.loads(record.get('body', '{}'))
-            data = body.get('data', [])
+# Rows per dashboard page; each age bucket is split into pages of at most this many meters
+PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 1000))
+PAGE_PREFIX = 'dashboard/'
+# Bump when the page markup changes, so pages fingerprinted by an older renderer are rendered again
+RENDER_VERSION = 1
 
-        # Deduplicate by serialNumber with latest timestamp
-        latest = {}
-        for item in data:
-            serial = item['serialNumber']
-            ts = int(item['timestamp'])
-            if serial not in latest or ts > int(latest[serial]['timestamp']):
-                latest[serial] = item
-        deduped_data = list(latest.values())
+# Age buckets in display order, with the slug used in their page keys and the minimum age in months
+AGE_BUCKETS = [
+    ("6+ months old", '6-months', 6),
+    ("9+ months old", '9-months', 9),
+    ("12+ months old", '12-months', 12),
+]
 
-        # Categorize by how old they are
-        now = datetime.datetime.utcnow().timestamp()
-        buckets = {
-            "6+ months old": [],
-            "9+ months old": [],
-            "12+ months old": []
-        }
+# Renders skipped by this container because the dashboard would not have changed
+skipped_renders = 0
 
-        for item in deduped_data:
-            ts = int(item.get("timestamp", 0))
-            months_old = (now - ts) / (60 * 60 * 24 * 30)
-            if months_old >= 12:
-                buckets["12+ months old"].append(item)
-            elif months_old >= 9:
-                buckets["9+ months old"].append(item)
-            elif months_old >= 6:
-                buckets["6+ months old"].append(item)
-
-        # Generate HTML
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Old Meters Dashboard</title>
+# Coalesces bursts of dashboard-gen-queue messages into one render of the newest version
+_debouncer = Debouncer()
+
+# Age index of the last view rendered by this container
+_age_index = {'items': None, 'index': None}
+
+STYLE = """
             <style>
                 body { font-family: Arial, sans-serif; padding: 2rem; background: #f9f9f9; }
                 h1 { text-align: center; }
@@ -53,34 +43,178 @@ def lambda_handler(event, context):
                 table { width: 100%; border-collapse: collapse; margin-top: 1rem; }
                 th, td { padding: 0.5rem; border: 1px solid #ccc; text-align: left; }
                 th { background: #f0f0f0; }
+                .pages a { margin-right: 1rem; }
             </style>
-        </head>
+"""
+
+
+class AgeIndex:
+    """Latest readings sorted by (timestamp, serialNumber), with the timestamps in an array.
+
+    The meters at least N months old are then a prefix of the sorted readings, found
+    with a binary search, so each age bucket is a slice between two cutoffs.
+    """
+
+    def __init__(self, items):
+        timestamps = [int(item.get("timestamp", 0)) for item in items]
+        serials = [str(item['serialNumber']) for item in items]
+        # Readings often share a timestamp (day-granularity dates, bulk submissions), so
+        # sort by serialNumber first and rely on the stable sort to keep that order
+        # within each timestamp
+        order = sorted(range(len(items)), key=serials.__getitem__)
+        order.sort(key=timestamps.__getitem__)
+        self.timestamps = array('q', [timestamps[i] for i in order])
+        self.items = [items[i] for i in order]
+
+    def buckets(self, now):
+        """Group meters by age bucket, each sorted with the oldest reading first."""
+        month = 60 * 60 * 24 * 30
+        # A meter is at least `months` old when its timestamp is at or before the cutoff
+        ends = [bisect_right(self.timestamps, now - months * month) for _, _, months in AGE_BUCKETS]
+        # Buckets are youngest first, so each one starts where the next older one ends
+        starts = ends[1:] + [0]
+        return {label: self.items[start:end] for (label, _, _), start, end in zip(AGE_BUCKETS, starts, ends)}
+
+
+def bucket_by_age(items, now):
+    """Group meters by age bucket, reusing the index while ``items`` is the same view."""
+    # latest_view returns the same list object until the view changes
+    if _age_index['items'] is not items:
+        _age_index.update(items=items, index=AgeIndex(items))
+    return _age_index['index'].buckets(now)
+
+
+def page_key(slug, number):
+    return f'{PAGE_PREFIX}{slug}/page-{number:04d}.html'
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    return (len(rows) + page_size - 1) // page_size
+
+
+def write_head(out, title):
+    out.write(f"""<!DOCTYPE html>
+        <html>
+        <head>
+            <title>{escape(title)}</title>{STYLE}        </head>
         <body>
-            <h1>Water Meters Needing Update</h1>
-        """
-
-        for label, items in buckets.items():
-            html += f"""
-            <div class="section">
-                <h2>{label} ({len(items)})</h2>
-                <table>
-                    <tr><th>Serial Number</th><th>Meter Value</th><th>Timestamp</th></tr>
-            """
-            for item in items:
-                html += f"<tr><td>{item['serialNumber']}</td><td>{item['meterValue']}</td><td>{item['timestamp']}</td></tr>"
-            html += "</table></div>"
-
-        html += "</body></html>"
-
-        # Upload to S3
+""")
+
+
+def render_index(buckets, page_size=PAGE_SIZE):
+    """Index page with the number of meters in each bucket and links to its pages."""
+    out = io.StringIO()
+    write_head(out, "Old Meters Dashboard")
+    out.write("            <h1>Water Meters Needing Update</h1>\n")
+    for label, slug, _ in AGE_BUCKETS:
+        rows = buckets[label]
+        out.write(f'            <div class="section">\n                <h2>{label} ({len(rows)})</h2>\n'
+                  f'                <div class="pages">')
+        for number in range(1, page_count(rows, page_size) + 1):
+            first = (number - 1) * page_size + 1
+            last = min(number * page_size, len(rows))
+            out.write(f'<a href="{page_key(slug, number)}">Page {number} ({first}-{last})</a>')
+        out.write("</div>\n            </div>\n")
+    out.write("        </body></html>")
+    return out.getvalue()
+
+
+def render_pages(buckets, page_size=PAGE_SIZE):
+    """Yield ``(key, html)`` for every page, one page at a time so only one is held in memory."""
+    for label, slug, _ in AGE_BUCKETS:
+        rows = buckets[label]
+        pages = page_count(rows, page_size)
+        for number in range(1, pages + 1):
+            out = io.StringIO()
+            write_head(out, f"{label} - page {number} of {pages}")
+            out.write(f'            <h1>{label} ({len(rows)})</h1>\n'
+                      f'            <p><a href="../../meter_dashboard.html">All buckets</a> | Page {number} of {pages}</p>\n'
+                      f'            <div class="section">\n                <table>\n'
+                      f'                    <tr><th>Serial Number</th><th>Meter Value</th><th>Timestamp</th></tr>\n')
+            # Cells are joined with control characters and escaped in one call per page,
+            # then the separators become the table markup
+            cells = "\x01".join(
+                f"{item['serialNumber']}\x00{item['meterValue']}\x00{item['timestamp']}"
+                for item in rows[(number - 1) * page_size:number * page_size]
+            )
+            out.write("<tr><td>")
+            out.write(escape(cells).replace("\x00", "</td><td>").replace("\x01", "</td></tr>\n<tr><td>"))
+            out.write("</td></tr>\n")
+            out.write("                </table>\n            </div>\n        </body></html>")
+            yield page_key(slug, number), out.getvalue()
+
+
+def dashboard_fingerprint(buckets, page_size=PAGE_SIZE):
+    """Fingerprint of every row the dashboard shows, by bucket and in page order."""
+    return fingerprint(RENDER_VERSION, page_size, [
+        [label, [[str(item['serialNumber']), item['meterValue'], item['timestamp']] for item in rows]]
+        for label, rows in buckets.items()
+    ])
+
+
+def lambda_handler(event, context):
+    global skipped_renders
+    try:
+        bucket_name = 'water-meter-s3-bucket'
+        file_name = 'meter_dashboard.html'
+
+        # Latest reading per serialNumber, maintained by df-updater
+        deduped_data, seq, response = debounced_readings(_debouncer, s3, sqs, event['Records'], bucket_name, 'df.json')
+        if response:
+            return response
+
+        # Categorize by how old they are
+        now = datetime.datetime.utcnow().timestamp()
+        buckets = bucket_by_age(deduped_data, now)
+
+        # Bucket membership only changes as meters age past a threshold or get new readings
+        inputs = dashboard_fingerprint(buckets)
+        if published_fingerprint(s3, bucket_name, file_name) == inputs:
+            skipped_renders += 1
+            print(f"Dashboard unchanged since the last render, skipped render and upload "
+                  f"({skipped_renders} skipped by this container)")
+            if seq is not None:
+                _debouncer.rendered(seq)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Dashboard unchanged'})
+            }
+
+        # Upload each page as soon as it is rendered
+        published = set()
+        for key, page in render_pages(buckets):
+            s3.put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=page.encode('utf-8'),
+                ContentType='text/html',
+                CacheControl='no-cache'
+            )
+            published.add(key)
+
+        # Upload the index last so it never links to a page that isn't there yet
         s3.put_object(
             Bucket=bucket_name,
             Key=file_name,
-            Body=html,
+            Body=render_index(buckets).encode('utf-8'),
             ContentType='text/html',
-            CacheControl='no-cache'
+            CacheControl='no-cache',
+            Metadata={FINGERPRINT: inputs}
         )
 
+        # Remove pages left over from a previous render with more stale meters
+        stale = []
+        paginator = s3.get_paginator('list_objects_v2')
+        for result in paginator.paginate(Bucket=bucket_name, Prefix=PAGE_PREFIX):
+            stale.extend({'Key': obj['Key']} for obj in result.get('Contents', []) if obj['Key'] not in published)
+        for i in range(0, len(stale), 1000):
+            s3.delete_objects(Bucket=bucket_name, Delete={'Objects': stale[i:i + 1000], 'Quiet': True})
+
+        if seq is not None:
+            _debouncer.rendered(seq)
+        print(f"Dashboard uploaded: {len(published)} pages, "
+              + ", ".join(f"{label}: {len(rows)}" for label, rows in buckets.items())
+              + (f", removed {len(stale)} old pages" if stale else ""))
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'Dashboard uploaded to S3'})
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+
+import latest_view
+
+# Wait this long after the newest change before rendering, so a burst renders once.
+# 0 renders as soon as a batch arrives, still skipping superseded batches. Waiting
+# needs ReportBatchItemFailures on the renderer's event source mapping and a
+# maxReceiveCount above MAX_STALENESS_SECONDS / WINDOW_SECONDS (see ``defer``).
+WINDOW_SECONDS = float(os.environ.get('RENDER_DEBOUNCE_SECONDS', 0))
+# Render no later than this long after the oldest change not yet rendered
+MAX_STALENESS_SECONDS = float(os.environ.get('RENDER_MAX_STALENESS_SECONDS', 60))
+
+RENDER = 'render'
+SKIP = 'skip'
+DEFER = 'defer'
+
+
+class Debouncer:
+    """Decides whether a batch of render messages should render now, be dropped or wait.
+
+    - A batch no newer than the last render is dropped.
+    - A batch superseded by a newer published version is dropped; that version's
+      own message is behind it in the FIFO group and renders it.
+    - A batch whose newest change is younger than the window waits for the rest of
+      the window, so later changes of the same burst are rendered together.
+    - Once the oldest change not yet rendered is ``max_staleness`` old the batch
+      renders regardless, so a steady stream of changes can't postpone it forever.
+
+    Renders always use the newest published version, not the one in the batch.
+    ``clock`` returns seconds and can be replaced for local simulations.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS, max_staleness=MAX_STALENESS_SECONDS, clock=time.time):
+        self.window = window
+        self.max_staleness = max_staleness
+        self.clock = clock
+        self.rendered_seq = None
+        # Sent time of the oldest change dropped or deferred since the last render
+        self.pending_since = None
+
+    def decide(self, batch_seq, head_seq, newest_sent, oldest_sent):
+        """Return ``(action, delay_seconds)`` for a batch; the delay only applies to DEFER."""
+        now = self.clock()
+        if self.rendered_seq is not None and batch_seq <= self.rendered_seq:
+            return SKIP, 0
+
+        if self.pending_since is None or oldest_sent < self.pending_since:
+            self.pending_since = oldest_sent
+        if now - self.pending_since >= self.max_staleness:
+            return RENDER, 0
+
+        if head_seq is not None and head_seq > batch_seq:
+            return SKIP, 0
+        wait = self.window - (now - newest_sent)
+        if wait > 0:
+            return DEFER, min(wait, self.pending_since + self.max_staleness - now)
+        return RENDER, 0
+
+    def rendered(self, seq):
+        self.rendered_seq = seq if self.rendered_seq is None else max(seq, self.rendered_seq)
+        self.pending_since = None
+
+
+def batch_versions(records):
+    """Newest snapshot seq in a batch and the sent times (seconds) of its newest and oldest message.
+
+    Returns None if no message carries a snapshot pointer.
+    """
+    seq, sent_times = None, []
+    for record in records:
+        body = json.loads(record.get('body', '{}'))
+        if isinstance(body.get('snapshot'), dict):
+            seq = body['snapshot']['seq'] if seq is None else max(seq, body['snapshot']['seq'])
+        sent = record.get('attributes', {}).get('SentTimestamp')
+        if sent:
+            sent_times.append(int(sent) / 1000)
+    if seq is None:
+        return None
+    if not sent_times:
+        sent_times = [time.time()]
+    return seq, max(sent_times), min(sent_times)
+
+
+def defer(sqs, records, delay):
+    """Hide the batch for ``delay`` seconds and return it as batch item failures for redelivery.
+
+    Each deferral counts as a receive, so the queue's maxReceiveCount must be above
+    ``MAX_STALENESS_SECONDS / WINDOW_SECONDS``.
+    """
+    arn = records[0]['eventSourceARN'].split(':')
+    queue_url = f'https://sqs.{arn[3]}.amazonaws.com/{arn[4]}/{arn[5]}'
+    entries = [{'Id': str(i), 'ReceiptHandle': record['receiptHandle'], 'VisibilityTimeout': int(delay) + 1}
+               for i, record in enumerate(records)]
+    for i in range(0, len(entries), 10):
+        sqs.change_message_visibility_batch(QueueUrl=queue_url, Entries=entries[i:i + 10])
+    return [{'itemIdentifier': record['messageId']} for record in records]
+
+
+def debounced_readings(debouncer, s3, sqs, records, bucket, base_key=latest_view.BASE_KEY):
+    """Readings a renderer should draw for a batch, after applying ``debouncer``.
+
+    Returns ``(readings, seq, response)``. When the batch is dropped or deferred,
+    ``readings`` is None and ``response`` is the Lambda response to return.
+    Otherwise pass ``seq`` (None for messages without a snapshot pointer) to
+    ``debouncer.rendered`` once the render is published.
+    """
+    versions = batch_versions(records)
+    current = latest_view.head(s3, bucket) if versions else None
+    if not current or current['seq'] is None:
+        return latest_view.readings_from_records(s3, records, bucket, base_key), None, None
+
+    batch_seq, newest_sent, oldest_sent = versions
+    action, delay = debouncer.decide(batch_seq, current['seq'], newest_sent, oldest_sent)
+    if action == SKIP:
+        print(f"Skipped batch at seq {batch_seq}: seq {current['seq']} is published "
+              f"and seq {debouncer.rendered_seq} was rendered")
+        return None, None, {'statusCode': 200, 'body': json.dumps({'message': 'Already rendered or superseded, render skipped'})}
+    if action == DEFER:
+        failures = defer(sqs, records, delay)
+        print(f"Deferred batch at seq {batch_seq} for {delay:.1f}s to collect later changes")
+        return None, None, {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Render deferred'}),
+            'batchItemFailures': failures
+        }
+
+    print(f"Rendering published seq {current['seq']} for batch at seq {batch_seq}")
+    return latest_view.fetch(s3, current), current['seq'], None
@@ -0,0 +1,117 @@
+import json
+from collections.abc import Iterable, Mapping
+from decimal import Decimal
+from itertools import islice
+
+# Separators produced by the DecimalEncoder the lambdas used to copy around
+SEPARATORS = (', ', ': ')
+COMPACT_SEPARATORS = (',', ':')
+
+# Elements encoded per chunk by iterdumps
+CHUNK_SIZE = 1000
+
+
+class _NeedsConversion(Exception):
+    pass
+
+
+def _default(obj):
+    # Called by the C encoder only for values it can't encode natively
+    if isinstance(obj, Decimal):
+        return _number(obj)
+    elif isinstance(obj, Mapping):
+        return dict(obj)
+    elif isinstance(obj, Iterable):
+        return list(obj)
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+_encoders = {
+    False: json.JSONEncoder(separators=SEPARATORS, default=_default),
+    True: json.JSONEncoder(separators=COMPACT_SEPARATORS, default=_default),
+}
+
+
+class _LegacyEncoder(json.JSONEncoder):
+    # The original pure-Python encoder, used only for values the fast path can't reproduce
+    def __init__(self, separators=SEPARATORS):
+        super().__init__()
+        self.item_sep, self.key_sep = separators
+
+    def encode(self, obj):
+        if isinstance(obj, Mapping):
+            return '{' + self.item_sep.join(f'{self.encode(k)}{self.key_sep}{self.encode(v)}' for (k, v) in obj.items()) + '}'
+        elif isinstance(obj, Iterable) and not isinstance(obj, str):
+            return '[' + self.item_sep.join(map(self.encode, obj)) + ']'
+        elif isinstance(obj, Decimal):
+            return f'{obj.normalize():f}'  # Removes trailing 0s, prevents scientific notation
+        else:
+            return super().encode(obj)
+
+
+def _number(value):
+    """int or float that json encodes to the same text as the normalized Decimal."""
+    text = str(value)
+    # Short plain spellings without an exponent or trailing zero are already normalized
+    if len(text) < 28 and 'E' not in text:
+        if '.' not in text:
+            if text.lstrip('-').isdigit() and text != '-0':
+                return int(text)
+        elif text[-1] != '0':
+            number = float(text)
+            if repr(number) == text:
+                return number
+
+    if not value.is_finite():
+        raise _NeedsConversion()
+    text = f'{value.normalize():f}'
+    if value == value.to_integral_value():
+        number = int(value)
+        if str(number) == text:
+            return number
+    else:
+        number = float(value)
+        if repr(number) == text:
+            return number
+    raise _NeedsConversion()
+
+
+def dumps(obj, compact=False):
+    """Serialize ``obj`` to JSON, writing Decimals without trailing zeros or exponents.
+
+    Output is identical to the old ``json.dumps(obj, cls=DecimalEncoder)``. The C
+    encoder does all the work and only calls back into Python for each Decimal, which
+    becomes the int or float with the same spelling. Decimals that have no exact float
+    spelling send the whole document through the pure-Python encoder instead. Non-string
+    dict keys are quoted as json does (the old encoder wrote them bare, which wasn't valid JSON).
+    """
+    try:
+        return _encoders[compact].encode(obj)
+    except _NeedsConversion:
+        return _LegacyEncoder(COMPACT_SEPARATORS if compact else SEPARATORS).encode(obj)
+
+
+def iterdumps(obj, compact=False, chunk_size=CHUNK_SIZE):
+    """Yield the same text as ``dumps`` in pieces, encoding top-level lists chunk by chunk."""
+    if isinstance(obj, Mapping) or isinstance(obj, str) or not isinstance(obj, Iterable):
+        yield dumps(obj, compact)
+        return
+
+    item_sep = COMPACT_SEPARATORS[0] if compact else SEPARATORS[0]
+    items = iter(obj)
+    first = True
+    yield '['
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            break
+        # Strip the brackets of the encoded chunk to splice it into the outer list
+        text = dumps(chunk, compact)[1:-1]
+        yield text if first else item_sep + text
+        first = False
+    yield ']'
+
+
+def dump(obj, fp, compact=False):
+    for chunk in iterdumps(obj, compact):
+        fp.write(chunk)
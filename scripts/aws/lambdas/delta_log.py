@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import time
+
+import columnar_snapshot
+import decimal_json
+from snapshot_store import SnapshotStore
+
+BASE_KEY = 'df.json'
+DELTA_PREFIX = 'df-deltas/'
+
+# Fold the segments into a new base once either limit is reached
+COMPACT_MAX_SEGMENTS = 50
+COMPACT_MAX_BYTES = 2 * 1024 * 1024
+
+# Object metadata on the base recording the last segment folded into it
+COMPACTED_THROUGH = 'compacted-through'
+# The same under the delta prefix, with the base's ETag, for local mirrors that drop metadata
+COMPACTED_MARKER = 'compacted-through.json'
+
+DELETE_ATTEMPTS = 3
+DELETE_BACKOFF_SECONDS = 0.1
+
+# Encoding used when compaction writes the base: 'json' (list of readings),
+# 'columnar' or 'columnar-gzip'. Readers accept any of them, and all of them give
+# back the readings exactly as they were.
+BASE_FORMAT = os.environ.get('SNAPSHOT_FORMAT', 'json')
+
+# Last snapshot fetched by this container, reused by warm invocations
+_cache = {'key': None, 'base_etag': None, 'seq': None, 'store': None}
+
+
+class DeltaLog:
+    """df.json stored as a base snapshot plus an append-only log of delta segments.
+
+    Each processed batch is written as one small segment object
+    (``df-deltas/<seq>.json``) holding its ops, either ``{"op": "put", "item": {...}}``
+    or ``{"op": "delete", "uuid": "..."}``. Once the log grows past the compaction
+    limits the current state is written back to ``df.json`` (a list of readings, or
+    columnar per ``SNAPSHOT_FORMAT``) and the folded segments are deleted. Readers get
+    base plus deltas from ``load``.
+
+    Readers skip segments at or below the base's compacted-through seq. Replaying
+    only some folded segments on top of the base could bring back a reading that a
+    later folded segment deleted. Folded segments that fail to delete are retried
+    at the next compaction.
+    """
+
+    def __init__(self, s3, bucket, base_key=BASE_KEY, prefix=DELTA_PREFIX, base_format=BASE_FORMAT,
+                 max_segments=COMPACT_MAX_SEGMENTS, max_bytes=COMPACT_MAX_BYTES):
+        self.s3 = s3
+        self.bucket = bucket
+        self.base_key = base_key
+        self.prefix = prefix
+        self.base_format = base_format
+        self.max_segments = max_segments
+        self.max_bytes = max_bytes
+
+        # Filled in by load()
+        self.base_etag = None
+        self.base_seq = 0
+        self.seq = 0
+        self.segments = []
+        # Folded segments still in the log, deleted at the next compaction
+        self.stale = []
+
+    def load(self, attempts=3):
+        """Read the base and every newer segment, returning a SnapshotStore."""
+        for attempt in range(attempts):
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.base_key)
+            base = decode_base(response['Body'].read())
+            self.base_etag = response.get('ETag')
+            self.base_seq = int(response.get('Metadata', {}).get(COMPACTED_THROUGH, 0))
+            listing = self._list_segments()
+            self.stale = [s for s in listing if s['seq'] <= self.base_seq]
+            self.segments = [s for s in listing if s['seq'] > self.base_seq]
+
+            # A gap means a compaction ran between reading the base and listing the log
+            if not self.segments or self.segments[0]['seq'] == self.base_seq + 1:
+                break
+            print(f"Delta log gap after seq {self.base_seq}, re-reading {self.base_key}")
+        else:
+            raise RuntimeError(f"Could not read a consistent {self.base_key} and delta log")
+
+        store = SnapshotStore.from_list(base)
+        self.seq = self.base_seq
+        self._apply(store, self.segments)
+        return store
+
+    def refresh(self, store):
+        """Bring ``store``, returned earlier by this log, up to date and return it.
+
+        Costs a HEAD of the base and a listing of the log: when the base is the one
+        ``store`` was built on and the log continues from ``self.seq``, only the newer
+        segments are fetched. Otherwise the state is loaded again from scratch.
+        """
+        response = self.s3.head_object(Bucket=self.bucket, Key=self.base_key)
+        if response.get('ETag') != self.base_etag:
+            print(f"{self.base_key} changed since it was loaded, reloading")
+            return self.load()
+
+        listing = self._list_segments()
+        segments = [s for s in listing if s['seq'] > self.base_seq]
+        known = [s for s in segments if s['seq'] <= self.seq]
+        if ([s['seq'] for s in segments] != list(range(self.base_seq + 1, self.base_seq + 1 + len(segments)))
+                or len(known) != self.seq - self.base_seq):
+            print(f"Delta log doesn't continue from seq {self.seq}, reloading")
+            return self.load()
+
+        self.stale = [s for s in listing if s['seq'] <= self.base_seq]
+        self.segments = known
+        self._apply(store, segments[len(known):])
+        return store
+
+    def _apply(self, store, segments):
+        for segment in segments:
+            response = self.s3.get_object(Bucket=self.bucket, Key=segment['key'])
+            apply_segment(store, json.loads(response['Body'].read().decode('utf-8')))
+            self.seq = segment['seq']
+            if segment not in self.segments:
+                self.segments.append(segment)
+
+    def read_items(self):
+        return self.load().to_list()
+
+    def pointer(self, changes=None):
+        """Claim-check reference to the current state, small enough for any queue message."""
+        return {
+            'bucket': self.bucket,
+            'key': self.base_key,
+            'etag': self.base_etag,
+            'seq': self.seq,
+            'changes': changes or {}
+        }
+
+    def commit(self, store, ops):
+        """Persist one batch of ops applied to ``store``, compacting when due.
+
+        Returns the sequence number the state is now at.
+        """
+        if not ops:
+            return self.seq
+
+        seq = self.seq + 1
+        body = decimal_json.dumps({'seq': seq, 'ops': ops}, compact=True)
+        pending_bytes = sum(s['size'] for s in self.segments) + len(body)
+
+        if len(self.segments) + 1 >= self.max_segments or pending_bytes >= self.max_bytes:
+            self.compact(store, seq)
+        else:
+            key = segment_key(self.prefix, seq)
+            # IfNoneMatch guards against a concurrent writer having taken this seq
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, IfNoneMatch='*')
+            self.segments.append({'key': key, 'seq': seq, 'size': len(body)})
+        self.seq = seq
+        return seq
+
+    def compact(self, store, seq):
+        response = self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.base_key,
+            Body=encode_base(store.to_list(), self.base_format),
+            Metadata={COMPACTED_THROUGH: str(seq)}
+        )
+        print(f"Compacted {len(self.segments)} delta segments into {self.base_key} at seq {seq}")
+        self.base_etag = response.get('ETag')
+        self.base_seq = seq
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + COMPACTED_MARKER,
+            Body=json.dumps({'seq': seq, 'etag': self.base_etag})
+        )
+
+        folded = self.stale + self.segments
+        failed = set(delete_keys(self.s3, self.bucket, [s['key'] for s in folded]))
+        if failed:
+            print(f"Could not delete {len(failed)} folded delta segments, retrying at the next compaction")
+        self.stale = [s for s in folded if s['key'] in failed]
+        self.segments = []
+
+    def _list_segments(self):
+        segments = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                seq = segment_seq(obj['Key'])
+                if seq is not None:
+                    segments.append({'key': obj['Key'], 'seq': seq, 'size': obj['Size']})
+        segments.sort(key=lambda s: s['seq'])
+        return segments
+
+
+def delete_keys(s3, bucket, keys, attempts=DELETE_ATTEMPTS):
+    """Delete objects in batches of 1000, retrying keys S3 reports as failed; returns those still failing."""
+    pending = list(keys)
+    for attempt in range(attempts):
+        failed = []
+        for i in range(0, len(pending), 1000):
+            response = s3.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in pending[i:i + 1000]], 'Quiet': True}
+            )
+            for error in response.get('Errors', []):
+                print(f"Failed to delete {error.get('Key')}: {error.get('Code')}")
+                failed.append(error['Key'])
+        pending = failed
+        if not pending:
+            break
+        if attempt + 1 < attempts:
+            time.sleep(DELETE_BACKOFF_SECONDS * 2 ** attempt)
+    return pending
+
+
+def segment_key(prefix, seq):
+    return f'{prefix}{seq:012d}.json'
+
+
+def segment_seq(key):
+    name = key.rsplit('/', 1)[-1]
+    if not name.endswith('.json') or not name[:-5].isdigit():
+        return None
+    return int(name[:-5])
+
+
+def encode_base(items, base_format=BASE_FORMAT):
+    if base_format == 'columnar':
+        return columnar_snapshot.dumps(items)
+    if base_format == 'columnar-gzip':
+        return columnar_snapshot.dumps(items, compress=True)
+    return decimal_json.dumps(items)
+
+
+def decode_base(raw):
+    return columnar_snapshot.loads(raw)
+
+
+def apply_segment(store, segment):
+    for op in segment.get('ops', []):
+        if op.get('op') == 'put':
+            store.insert(op['item'])
+        elif op.get('op') == 'delete':
+            store.delete(op['uuid'])
+
+
+def fetch_snapshot(s3, pointer):
+    """Return a SnapshotStore at least as new as ``pointer``, reusing the cached copy.
+
+    When the cached copy has the same base only the segments between its seq and the
+    pointer's seq are fetched; anything else (cold container, compacted base, missing
+    segment) falls back to a full ``DeltaLog.load``.
+    """
+    bucket, key, seq = pointer['bucket'], pointer['key'], pointer['seq']
+    prefix = pointer.get('prefix', DELTA_PREFIX)
+
+    if _cache['store'] is not None and _cache['key'] == key:
+        if _cache['seq'] >= seq:
+            print(f"Using cached snapshot at seq {_cache['seq']}")
+            return _cache['store']
+
+        if _cache['base_etag'] == pointer.get('etag'):
+            try:
+                for next_seq in range(_cache['seq'] + 1, seq + 1):
+                    response = s3.get_object(Bucket=bucket, Key=segment_key(prefix, next_seq))
+                    apply_segment(_cache['store'], json.loads(response['Body'].read().decode('utf-8')))
+                    _cache['seq'] = next_seq
+                print(f"Caught cached snapshot up to seq {seq}")
+                return _cache['store']
+            except Exception as e:
+                print("Incremental snapshot fetch failed, reloading:", str(e))
+
+    log = DeltaLog(s3, bucket, base_key=key, prefix=prefix)
+    store = log.load()
+    _cache.update(key=key, base_etag=log.base_etag, seq=log.seq, store=store)
+    print(f"Loaded snapshot {key} at seq {log.seq}")
+    return store
+
+
+def snapshot_from_records(s3, records, bucket, base_key=BASE_KEY):
+    """Readings for the newest snapshot referenced by a batch of map/dashboard queue messages."""
+    pointer = None
+    data = None
+    for record in records:
+        body = json.loads(record.get('body', '{}'))
+        if isinstance(body.get('snapshot'), dict):
+            if pointer is None or body['snapshot']['seq'] >= pointer['seq']:
+                pointer = body['snapshot']
+        elif isinstance(body.get('data'), list) and body['data']:
+            # Full-dataset message queued before the claim-check format
+            data = body['data']
+
+    if pointer:
+        print(f"Using snapshot {pointer['key']} at seq {pointer['seq']}, changes: {pointer.get('changes')}")
+        return fetch_snapshot(s3, pointer)
+    if data:
+        print("Using data from event payload")
+        return data
+    print(f"Falling back to {base_key} from S3")
+    return DeltaLog(s3, bucket, base_key=base_key).load()
+
+
+def read_local(data_dir, base_name=BASE_KEY, prefix=DELTA_PREFIX):
+    """Base plus deltas from a local mirror of the bucket (e.g. ``aws s3 sync --delete``).
+
+    The mirror has no object metadata, so the segments already folded into the base
+    are found from the compaction marker. If the marker doesn't match the base (its
+    ETag isn't the base's MD5, e.g. a partial sync) every segment is replayed.
+    """
+    with open(os.path.join(data_dir, base_name), 'rb') as f:
+        raw = f.read()
+    store = SnapshotStore.from_list(decode_base(raw))
+
+    delta_dir = os.path.join(data_dir, prefix)
+    base_seq = 0
+    marker = os.path.join(delta_dir, COMPACTED_MARKER)
+    if os.path.exists(marker):
+        with open(marker, encoding='utf-8') as f:
+            compacted = json.load(f)
+        # A single-part upload's ETag is the MD5 of its body
+        if (compacted.get('etag') or '').strip('"') == hashlib.md5(raw).hexdigest():
+            base_seq = compacted['seq']
+        else:
+            print(f"{COMPACTED_MARKER} doesn't match {base_name}, replaying every delta segment")
+
+    if os.path.isdir(delta_dir):
+        names = sorted(name for name in os.listdir(delta_dir)
+                       if segment_seq(name) is not None and segment_seq(name) > base_seq)
+        for name in names:
+            with open(os.path.join(delta_dir, name), 'rb') as f:
+                apply_segment(store, json.loads(f.read().decode('utf-8')))
+    return store.to_list()
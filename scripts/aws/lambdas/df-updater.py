@@ -1,115 +1,171 @@
 import json
-import boto3
-from decimal import Decimal
 from datetime import datetime
-from collections.abc import Mapping, Iterable
-
-class DecimalEncoder(json.JSONEncoder):
-    def encode(self, obj):
-        if isinstance(obj, Mapping):
-            return '{' + ', '.join(f'{self.encode(k)}: {self.encode(v)}' for (k, v) in obj.items()) + '}'
-        elif isinstance(obj, Iterable) and not isinstance(obj, str):
-            return '[' + ', '.join(map(self.encode, obj)) + ']'
-        elif isinstance(obj, Decimal):
-            return f'{obj.normalize():f}'
-        else:
-            return super().encode(obj)
-
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
+from delta_log import DeltaLog
+import latest_view
+import aws_runtime
+
+s3 = aws_runtime.client('s3')
+sqs = aws_runtime.client('sqs')
 
 bucket_name = 'water-meter-s3-bucket'
 df_file = 'df.json'
 map_gen_queue_url = "https://sqs.us-west-1.amazonaws.com/<account_id>/map-gen-queue.fifo"
 dashboard_gen_queue_url = "https://sqs.us-west-1.amazonaws.com/<account_id>/dashboard-gen-queue.fifo"
 
+# Delta log seq the latest-per-meter view was last published at by this container
+_published_seq = None
+
+# Delta log and state loaded by this container. df-updater is the only writer, so warm
+# invocations only fetch segments written since; dropped whenever a batch may have left
+# the store ahead of what was committed.
+_log = None
+_store = None
+
+
+def parse_record(record):
+    body = json.loads(record['body'])
+    event_type = body.get('eventType') or 'unknown'
+    new_item = body.get('newItem') if isinstance(body.get('newItem'), dict) else None
+    old_item = body.get('oldItem') if isinstance(body.get('oldItem'), dict) else None
+    return event_type, new_item, old_item
+
+
+def apply_event(store, event_type, new_item, old_item):
+    """Apply one stream event and return the delta log ops it produced."""
+    if event_type == "INSERT" and new_item:
+        store.insert(new_item)
+        return [{"op": "put", "item": new_item}]
+    elif event_type == "MODIFY" and new_item:
+        if old_item and old_item.get('uuid') not in (None, new_item['uuid']):
+            # stream-handler coalesced a REMOVE and re-INSERT of the same key into one MODIFY
+            store.delete(old_item['uuid'])
+            store.insert(new_item)
+            return [{"op": "delete", "uuid": old_item['uuid']}, {"op": "put", "item": new_item}]
+        if store.replace(new_item):
+            return [{"op": "put", "item": new_item}]
+    elif event_type == "REMOVE" and old_item:
+        if store.delete(old_item['uuid']) is not None:
+            return [{"op": "delete", "uuid": old_item['uuid']}]
+    else:
+        print("Skipped unrecognized or incomplete event")
+    return []
+
 
 def lambda_handler(event, context):
+    global _published_seq, _log, _store
+    # Messages that could not be persisted and should be redelivered (ReportBatchItemFailures)
+    failed_ids = []
+
     try:
+        log, store = _log, _store
+        _log = _store = None
+        try:
+            if store is None:
+                log = DeltaLog(s3, bucket_name, base_key=df_file)
+                store = log.load()
+            else:
+                store = log.refresh(store)
+        except Exception as e:
+            print("Failed to read df.json from S3:", str(e))
+            raise e
+        # Loading marks every meter as changed; only this batch's changes matter
+        store.pop_latest_changes()
+        # Republish when this container hasn't published the view of the loaded state
+        stale_view = _published_seq != log.seq
+
+        keep_warm = True
+
+        # Apply every record of the batch in order against the single in-memory copy.
+        # Records that cannot be parsed or applied are logged and skipped, as before.
+        applied_ids = []
+        skipped_ids = []
+        ops = []
+        changes = {"INSERT": 0, "MODIFY": 0, "REMOVE": 0}
         for record in event['Records']:
-            try:
-                body = json.loads(record['body'])
-            except Exception as e:
-                print("Failed to parse body:", str(e))
-                continue
+            message_id = record.get('messageId')
 
             try:
-                event_type = body.get('eventType') or 'unknown'
-                new_item = body.get('newItem') if isinstance(body.get('newItem'), dict) else None
-                old_item = body.get('oldItem') if isinstance(body.get('oldItem'), dict) else None
-                uuid = (
-                    new_item.get('uuid')
-                    if new_item else
-                    old_item.get('uuid')
-                    if old_item else
-                    'unknown'
-                )
+                event_type, new_item, old_item = parse_record(record)
             except Exception as e:
-                print("Failed during event metadata parsing:", str(e))
+                print("Failed to parse body:", message_id, str(e))
+                skipped_ids.append(message_id)
                 continue
 
             try:
-                response = s3.get_object(Bucket=bucket_name, Key=df_file)
-                data = json.loads(response['Body'].read().decode('utf-8'))
+                event_ops = apply_event(store, event_type, new_item, old_item)
+                if event_ops:
+                    ops.extend(event_ops)
+                    changes[event_type] += 1
+                applied_ids.append(message_id)
             except Exception as e:
-                print("Failed to read df.json from S3:", str(e))
-                continue
+                print("Failed to update df in memory:", message_id, str(e))
+                skipped_ids.append(message_id)
+                # The event may have been applied in part, without its ops
+                keep_warm = False
 
+        if ops:
             try:
-                if event_type == "INSERT" and new_item:
-                    data.append(new_item)
-                elif event_type == "MODIFY" and new_item:
-                    uid = new_item['uuid']
-                    data = [item if item['uuid'] != uid else new_item for item in data]
-                elif event_type == "REMOVE" and old_item:
-                    uid = old_item['uuid']
-                    data = [item for item in data if item['uuid'] != uid]
-                else:
-                    print("Skipped unrecognized or incomplete event")
+                log.commit(store, ops)
             except Exception as e:
-                print("Failed to update df in memory:", str(e))
-                continue
+                print("Failed to write df.json delta to S3:", str(e))
+                failed_ids.extend(applied_ids)
+                ops = []
+                keep_warm = False
 
+        # The renderers only show the latest reading per meter, so they are only
+        # notified when that view changed
+        latest = None
+        changed_meters = store.pop_latest_changes() if ops else set()
+        if not failed_ids and (changed_meters or stale_view):
             try:
-                s3.put_object(
-                    Bucket=bucket_name,
-                    Key=df_file,
-                    Body=json.dumps(data, indent=2, cls=DecimalEncoder)
-                )
+                latest = latest_view.publish(s3, bucket_name, store, log.seq)
+                _published_seq = log.seq
             except Exception as e:
-                print("Failed to upload df.json to S3:", str(e))
-                continue
+                print("Failed to write latest view to S3:", str(e))
+                failed_ids.extend(applied_ids)
+        elif ops:
+            print("Latest reading per meter unchanged, skipping map and dashboard updates")
 
-            try:
-                sqs.send_message(
-                    QueueUrl=map_gen_queue_url,
-                    MessageBody=json.dumps({
-                        "data": data
-                    }, cls=DecimalEncoder),
-                    MessageGroupId="map-gen"
-                )
-            except Exception as e:
-                print("Failed to send message to map-gen-queue:", str(e))
+        if latest:
+            # Claim check: consumers fetch the snapshot from S3, so messages stay tiny
+            changes["readings"] = len(store)
+            changes["meters"] = len(changed_meters)
+            message = json.dumps({"snapshot": log.pointer(changes), "latest": latest})
 
-            try:
-                sqs.send_message(
-                    QueueUrl=dashboard_gen_queue_url,
-                    MessageBody=json.dumps({
-                        "data": data
-                    }, cls=DecimalEncoder),
-                    MessageGroupId="dashboard-gen"
-                )
-            except Exception as e:
-                print("Failed to send message to dashboard-gen-queue:", str(e))
+            # The renderers drop older batches once a newer view is published, so that
+            # view's message has to arrive: a failed send fails the batch, and its
+            # redelivery publishes and notifies again
+            notified = True
+            for queue_url, group in ((map_gen_queue_url, "map-gen"), (dashboard_gen_queue_url, "dashboard-gen")):
+                try:
+                    sqs.send_message(
+                        QueueUrl=queue_url,
+                        MessageBody=message,
+                        MessageGroupId=group
+                    )
+                except Exception as e:
+                    print(f"Failed to send message to {group}-queue:", str(e))
+                    notified = False
+            if not notified:
+                _published_seq = None
+                failed_ids.extend(applied_ids)
+
+        if keep_warm:
+            _log, _store = log, store
+
+        print(f"Applied {len(applied_ids)} of {len(event['Records'])} records, "
+              f"skipped {len(skipped_ids)}, failed {len(failed_ids)}")
 
         return {
             "statusCode": 200,
-            "body": json.dumps({"message": "Processed messages from queue"})
+            "body": json.dumps({"message": "Processed messages from queue"}),
+            "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_ids]
         }
 
     except Exception as e:
         print("Top-level error:", str(e))
         return {
             "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
+            "body": json.dumps({"error": str(e)}),
+            "batchItemFailures": [{"itemIdentifier": record.get('messageId')} for record in event.get('Records', [])]
         }
@@ -0,0 +1,25 @@
+import hashlib
+
+from botocore.exceptions import ClientError
+
+import decimal_json
+
+# Object metadata holding the fingerprint of the inputs the object was rendered from
+FINGERPRINT = 'render-fingerprint'
+
+
+def fingerprint(*inputs):
+    """Hash of JSON-serializable render inputs; equal inputs give equal fingerprints."""
+    digest = hashlib.sha256()
+    for value in inputs:
+        digest.update(decimal_json.dumps(value, compact=True).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def published_fingerprint(s3, bucket, key):
+    """Fingerprint recorded on the published object, or None if it has none or doesn't exist."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key).get('Metadata', {}).get(FINGERPRINT)
+    except ClientError:
+        return None
@@ -0,0 +1,77 @@
+import json
+
+from botocore.exceptions import ClientError
+
+import decimal_json
+from delta_log import BASE_KEY, snapshot_from_records
+from snapshot_store import SnapshotStore, latest_per_meter
+
+# Latest reading per meter, published next to df.json by df-updater
+LATEST_KEY = 'df-latest.json'
+
+# Object metadata recording the delta log seq the view was built from
+SNAPSHOT_SEQ = 'snapshot-seq'
+
+# Last view fetched by this container, reused by warm invocations
+_cache = {'key': None, 'etag': None, 'items': None}
+
+
+def publish(s3, bucket, store, seq, key=LATEST_KEY):
+    """Write ``store.latest_items()`` as a list of readings and return its reference."""
+    response = s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=decimal_json.dumps(store.latest_items(), compact=True),
+        ContentType='application/json',
+        Metadata={SNAPSHOT_SEQ: str(seq)}
+    )
+    return {'bucket': bucket, 'key': key, 'etag': response.get('ETag'), 'seq': seq}
+
+
+def head(s3, bucket, key=LATEST_KEY):
+    """Reference to the currently published view, or None if there isn't one."""
+    try:
+        response = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError:
+        return None
+    seq = response.get('Metadata', {}).get(SNAPSHOT_SEQ)
+    return {'bucket': bucket, 'key': key, 'etag': response.get('ETag'), 'seq': int(seq) if seq else None}
+
+
+def fetch(s3, pointer):
+    """Readings of the view ``pointer`` refers to, reusing the cached copy when unchanged."""
+    bucket, key = pointer['bucket'], pointer['key']
+    if _cache['items'] is not None and _cache['key'] == key and _cache['etag'] == pointer.get('etag'):
+        print(f"Using cached {key}")
+        return _cache['items']
+
+    response = s3.get_object(Bucket=bucket, Key=key)
+    items = json.loads(response['Body'].read().decode('utf-8'))
+    _cache.update(key=key, etag=response.get('ETag'), items=items)
+    print(f"Loaded {key} with {len(items)} meters")
+    return items
+
+
+def readings_from_records(s3, records, bucket, base_key=BASE_KEY):
+    """Latest reading per meter for the newest state referenced by a batch of queue messages.
+
+    Uses the published view when the newest message points at one, otherwise
+    deduplicates the full snapshot the same way.
+    """
+    newest = None
+    for record in records:
+        body = json.loads(record.get('body', '{}'))
+        if isinstance(body.get('latest'), dict) and isinstance(body.get('snapshot'), dict):
+            if newest is None or body['snapshot']['seq'] >= newest['snapshot']['seq']:
+                newest = body
+
+    if newest:
+        try:
+            return fetch(s3, newest['latest'])
+        except Exception as e:
+            print(f"Failed to read {newest['latest']['key']}, deduplicating the snapshot:", str(e))
+
+    data = snapshot_from_records(s3, records, bucket, base_key)
+    if isinstance(data, SnapshotStore):
+        return data.latest_items()
+    return latest_per_meter(data)
@@ -1,74 +1,390 @@
 import json
-import boto3
-import folium
-from folium import plugins
+import os
+import string
+import time
+from botocore.exceptions import ClientError
+import decimal_json
+import map_template
+from fingerprint import FINGERPRINT, fingerprint, published_fingerprint
+from debounce import Debouncer, debounced_readings
+from marker_tiles import MANIFEST_KEY, TILE_PREFIX, MarkerTiles
+import aws_runtime
+
+s3 = aws_runtime.client('s3')
+sqs = aws_runtime.client('sqs')
+
+bucket_name = 'water-meter-s3-bucket'
+boundaries_key = 'crescenta_boundaries.geojson'
+map_key = 'crescenta_valley_polygons_with_boundaries.html'
+markers_key = 'crescenta_meters.json'
+
+# 'template' renders every marker into the page from the precompiled folium template
+# (map_template.json); 'folium' renders the same page with folium itself, which is
+# then imported on first use; 'data' publishes the page once as a static shell and
+# each render only uploads the marker data file it loads; 'tiles' does the same with
+# per-zoom cluster tiles the page loads for its viewport
+MAP_MODE = os.environ.get('MAP_MODE', 'template')
+
+MARKERS_FORMAT = 'water-meter-markers'
+MARKERS_VERSION = 1
+# Bump when the page markup changes, so pages fingerprinted by an older renderer are rendered again
+RENDER_VERSION = 1
+# Decimal places kept for marker coordinates (1e-6 degrees is about 10 cm)
+MARKER_COORDINATE_PRECISION = 6
+
+# Object metadata on the shell recording the mode and boundaries version it was built from
+SHELL_VERSION = 'shell-version'
+
+# Takes the place of the marker scripts in the shell. Popups are built when opened and
+# use textContent, so they read the same as the folium popups.
+MARKER_LOADER = string.Template("""
+            fetch("$url", {cache: "no-cache"})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    var scale = Math.pow(10, data.precision);
+                    var popup = function (i) {
+                        return function () {
+                            var div = document.createElement("div");
+                            div.textContent = "Serial Number: " + data.serialNumber[i]
+                                + "\\n\\nMeter Value: " + data.meterValue[i];
+                            return div;
+                        };
+                    };
+                    var markers = [];
+                    for (var i = 0; i < data.count; i++) {
+                        markers.push(L.marker([data.lat[i] / scale, data.lon[i] / scale]).bindPopup(popup(i)));
+                    }
+                    $layer.addLayers(markers);
+                });
+""")
+
+# Tile loader for the 'tiles' shell: on every move it shows the tiles of the current
+# zoom that cover the viewport. Clusters use the markercluster styles and zoom to
+# their bounding box when clicked.
+TILE_LOADER = string.Template("""
+            (function (map) {
+                var tileLayer = L.layerGroup().addTo(map);
+                var manifest = null;
+                var shown = {};
+                var fetched = {};
+                var popup = function (meter) {
+                    return function () {
+                        var div = document.createElement("div");
+                        div.textContent = "Serial Number: " + meter[2] + "\\n\\nMeter Value: " + meter[3];
+                        return div;
+                    };
+                };
+                var clusterIcon = function (count) {
+                    var size = count < 10 ? "small" : count < 100 ? "medium" : "large";
+                    return L.divIcon({
+                        html: "<div><span>" + count + "</span></div>",
+                        className: "marker-cluster marker-cluster-" + size,
+                        iconSize: L.point(40, 40)
+                    });
+                };
+                var drawTile = function (tile) {
+                    var group = L.layerGroup();
+                    (tile.clusters || []).forEach(function (c) {
+                        L.marker([c[0], c[1]], {icon: clusterIcon(c[2])})
+                            .on("click", function () { map.fitBounds([[c[3], c[4]], [c[5], c[6]]]); })
+                            .addTo(group);
+                    });
+                    (tile.meters || []).forEach(function (m) {
+                        L.marker([m[0], m[1]]).bindPopup(popup(m)).addTo(group);
+                    });
+                    return group;
+                };
+                var refresh = function () {
+                    if (!manifest) { return; }
+                    var zoom = Math.max(manifest.minZoom, Math.min(manifest.maxZoom, Math.round(map.getZoom())));
+                    var bounds = map.getBounds();
+                    var nw = map.project(bounds.getNorthWest(), zoom).divideBy(256).floor();
+                    var se = map.project(bounds.getSouthEast(), zoom).divideBy(256).floor();
+                    var wanted = {};
+                    for (var x = nw.x; x <= se.x; x++) {
+                        for (var y = nw.y; y <= se.y; y++) {
+                            var key = zoom + "/" + x + "/" + y;
+                            if (manifest.tiles[key]) { wanted[key] = manifest.tiles[key]; }
+                        }
+                    }
+                    Object.keys(shown).forEach(function (key) {
+                        if (!wanted[key]) { tileLayer.removeLayer(shown[key]); delete shown[key]; }
+                    });
+                    Object.keys(wanted).forEach(function (key) {
+                        if (shown[key]) { return; }
+                        var url = "$prefix" + key + ".json?v=" + wanted[key];
+                        fetched[url] = fetched[url] || fetch(url).then(function (r) { return r.json(); }).then(drawTile);
+                        fetched[url].then(function (group) {
+                            if (!shown[key] && wanted === current) { shown[key] = group.addTo(tileLayer); }
+                        });
+                    });
+                    current = wanted;
+                };
+                var current = null;
+                fetch("$manifest", {cache: "no-cache"})
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) { manifest = data; refresh(); });
+                map.on("moveend", refresh);
+            })($map);
+""")
+
+# Boundary GeoJSON and the map rendered around an empty marker layer, reused by warm
+# invocations until the boundary object's ETag changes
+_base_cache = {'etag': None, 'boundaries': None, 'map': None, 'layer': None, 'head': None, 'tail': None,
+               'shell_version': None}
+
+# Cluster tiles of the meters, updated incrementally by warm invocations
+_tiles = MarkerTiles()
+
+# Renders skipped by this container because the map would not have changed
+skipped_renders = 0
+
+# Coalesces bursts of map-gen-queue messages into one render of the newest version
+_debouncer = Debouncer()
+
+
+def render_base_folium(crescenta_boundaries):
+    """``(head, tail, map name, marker layer name)`` of the map page, rendered with folium."""
+    import folium
+    from folium import plugins
+
+    # Create Folium map
+    m = folium.Map(
+        location=[34.216, -118.227],
+        zoom_start=13,
+        min_lat=34.20, max_lat=34.27,
+        min_lon=-118.30, max_lon=-118.20,
+        no_wrap=True,
+        control_scale=True,
+        min_zoom=9,
+    )
+
+    folium.GeoJson(crescenta_boundaries, name="Crescenta Valley Boundaries").add_to(m)
+    meters = plugins.MarkerCluster().add_to(m)
+
+    # Marker scripts go right before the cluster is added to the map, as in a full render
+    html = m.get_root().render()
+    split = html.rindex('\n', 0, html.rindex(f'{meters.get_name()}.addTo(')) + 1
+    return html[:split], html[split:], m.get_name(), meters.get_name()
+
+
+def load_base_map():
+    """Return the cached base map, refetching the boundaries only if they changed in S3."""
+    request = {'Bucket': bucket_name, 'Key': boundaries_key}
+    if _base_cache['etag']:
+        request['IfNoneMatch'] = _base_cache['etag']
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            return _base_cache, True
+        raise
+
+    crescenta_boundaries = json.loads(response['Body'].read().decode('utf-8'))
+
+    if MAP_MODE == 'folium':
+        head, tail, map_name, layer_name = render_base_folium(crescenta_boundaries)
+    else:
+        head, tail, map_name, layer_name = map_template.render_page(crescenta_boundaries)
+    _base_cache.update(
+        etag=response.get('ETag'),
+        boundaries=crescenta_boundaries,
+        map=map_name,
+        layer=layer_name,
+        head=head,
+        tail=tail
+    )
+    return _base_cache, False
+
+
+def render_markers(layer_name, rows):
+    """Marker scripts for the base map's marker layer, rendered with folium."""
+    import folium
+    from branca.element import Figure, MacroElement
+
+    class LayerRef(MacroElement):
+        """Stands in for a layer of the cached base map so markers can be rendered on their own."""
+
+        def __init__(self, name):
+            super().__init__()
+            self.layer_name = name
+
+        def get_name(self):
+            return self.layer_name
+
+    figure = Figure()
+    meters = LayerRef(layer_name)
+    figure.add_child(meters)
+
+    for row in rows:
+        coord = row.get('coordinate')
+        if not isinstance(coord, list) or len(coord) != 2:
+            continue
+        lat, lon = coord
+        label = f"Serial Number: {row['serialNumber']}\n\nMeter Value: {row['meterValue']}"
+        folium.Marker(location=[lat, lon], popup=label).add_to(meters)
+
+    for marker in meters._children.values():
+        marker.render()
+    return figure.script.render()
+
+
+def render_shell(base, mode):
+    if mode == 'tiles':
+        loader = TILE_LOADER.substitute(map=base['map'], prefix=TILE_PREFIX, manifest=MANIFEST_KEY)
+    else:
+        loader = MARKER_LOADER.substitute(url=markers_key, layer=base['layer'])
+    return base['head'] + loader + base['tail']
+
+
+def publish_shell(base, mode):
+    """Upload the static map page unless it was already built for this mode and these boundaries."""
+    version = mode + '-' + base['etag'].strip('"')
+    if base['shell_version'] == version:
+        return False
+    try:
+        published = s3.head_object(Bucket=bucket_name, Key=map_key).get('Metadata', {})
+    except ClientError:
+        published = {}
+
+    if published.get(SHELL_VERSION) != version:
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=map_key,
+            Body=render_shell(base, mode).encode('utf-8'),
+            ContentType='text/html',
+            CacheControl='no-cache',
+            Metadata={SHELL_VERSION: version}
+        )
+        print("Map shell updated in S3")
+    base['shell_version'] = version
+    return True
+
+
+def encode_markers(rows):
+    """Pack the meters the shell shows into parallel arrays, with coordinates as scaled integers."""
+    scale = 10 ** MARKER_COORDINATE_PRECISION
+    lats, lons, serials, values = [], [], [], []
+    for row in rows:
+        coord = row.get('coordinate')
+        if not isinstance(coord, list) or len(coord) != 2:
+            continue
+        lats.append(int(round(float(coord[0]) * scale)))
+        lons.append(int(round(float(coord[1]) * scale)))
+        serials.append(row['serialNumber'])
+        values.append(row['meterValue'])
+
+    document = {
+        'format': MARKERS_FORMAT,
+        'version': MARKERS_VERSION,
+        'count': len(lats),
+        'precision': MARKER_COORDINATE_PRECISION,
+        'lat': lats,
+        'lon': lons,
+        'serialNumber': serials,
+        'meterValue': values,
+    }
+    return decimal_json.dumps(document, compact=True).encode('utf-8')
+
+
+def map_fingerprint(rows, base):
+    """Fingerprint of what the map shows: each marker's position and popup, and the boundaries."""
+    markers = [
+        [row['coordinate'][0], row['coordinate'][1], str(row['serialNumber']), row['meterValue']]
+        for row in rows
+        if isinstance(row.get('coordinate'), list) and len(row['coordinate']) == 2
+    ]
+    markers.sort(key=lambda marker: marker[2])
+    # In 'data' mode the boundaries are in the shell, not in the marker file
+    boundaries = base['etag'] if MAP_MODE != 'data' else None
+    return fingerprint(MAP_MODE, RENDER_VERSION, folium_version(), MARKERS_VERSION, boundaries, markers)
+
+
+def folium_version():
+    """Version of the folium the page comes from in this mode, None when folium doesn't render it."""
+    if MAP_MODE == 'template':
+        return map_template.load()['folium_version']
+    if MAP_MODE == 'folium':
+        return map_template.installed_folium_version()
+    return None
+
 
 def lambda_handler(event, context):
+    global skipped_renders
     try:
-        s3 = boto3.client('s3')
-        bucket_name = 'water-meter-s3-bucket'
         file_name = 'df.json'
 
-        # memo: queue has limit of 256kb
-        for record in event['Records']:
-            body = json.loads(record.get('body', '{}'))
+        # memo: queue has limit of 256kb, so df-updater sends a pointer to the snapshot instead of the data
+        # df-updater also keeps the latest reading per serialNumber, so this is already deduplicated
+        deduped_data, seq, response = debounced_readings(_debouncer, s3, sqs, event['Records'], bucket_name, file_name)
+        if response:
+            return response
+        print("Deduplicated data length:", len(deduped_data))
+
+        start = time.perf_counter()
+        base, warm = load_base_map()
+        base_ms = (time.perf_counter() - start) * 1000
+
+        if MAP_MODE == 'tiles':
+            publish_shell(base, MAP_MODE)
+            dirty = _tiles.update(deduped_data)
+            render_ms = (time.perf_counter() - start) * 1000 - base_ms
+            print(f"Indexed {len(_tiles.meters)} meters, {len(dirty)} tiles affected in {render_ms:.0f} ms, "
+                  f"{'warm' if warm else 'cold'} base map in {base_ms:.0f} ms")
+
+            # Only tiles whose content changed are uploaded; tiles a failed publish left
+            # pending are published along with them
+            stats = _tiles.publish(s3, bucket_name)
+            print(f"Map tiles updated in S3: {stats}")
+        else:
+            if MAP_MODE == 'data':
+                publish_shell(base, MAP_MODE)
+            output_key = markers_key if MAP_MODE == 'data' else map_key
+            inputs = map_fingerprint(deduped_data, base)
 
-            # Use event data if present and valid
-            if isinstance(body.get('data'), list) and body['data']:
-                data = body['data']
-                print("Using data from event payload")
+            if published_fingerprint(s3, bucket_name, output_key) == inputs:
+                skipped_renders += 1
+                print(f"Markers unchanged since the last render, skipped render and upload "
+                      f"({skipped_renders} skipped by this container)")
+            elif MAP_MODE == 'data':
+                body = encode_markers(deduped_data)
+                render_ms = (time.perf_counter() - start) * 1000 - base_ms
+                print(f"Encoded {len(deduped_data)} meters ({len(body)} bytes) in {render_ms:.0f} ms, "
+                      f"{'warm' if warm else 'cold'} base map in {base_ms:.0f} ms")
+
+                # Only the marker data changes between renders
+                s3.put_object(
+                    Bucket=bucket_name,
+                    Key=markers_key,
+                    Body=body,
+                    ContentType='application/json',
+                    CacheControl='no-cache',
+                    Metadata={FINGERPRINT: inputs}
+                )
+                print("Map data updated in S3")
             else:
-                print("Falling back to df.json from S3")
-                response = s3.get_object(Bucket=bucket_name, Key=file_name)
-                data = json.loads(response['Body'].read().decode('utf-8'))
-
-        # Deduplicate by latest timestamp for each serialNumber
-        latest = {}
-        for item in data:
-            serial = item['serialNumber']
-            ts = int(item['timestamp'])
-            if serial not in latest or ts > int(latest[serial]['timestamp']):
-                latest[serial] = item
-        deduped_data = list(latest.values())
-        print("Deduplicated data length:", len(deduped_data))
+                if MAP_MODE == 'folium':
+                    markers = render_markers(base['layer'], deduped_data)
+                else:
+                    markers = map_template.render_markers(deduped_data)
+                html = base['head'] + markers + base['tail']
+                render_ms = (time.perf_counter() - start) * 1000 - base_ms
+                print(f"Rendered {len(deduped_data)} meters in {render_ms:.0f} ms, "
+                      f"{'warm' if warm else 'cold'} base map in {base_ms:.0f} ms")
 
-        # Load boundary GeoJSON
-        response = s3.get_object(Bucket=bucket_name, Key='crescenta_boundaries.geojson')
-        crescenta_boundaries = json.loads(response['Body'].read().decode('utf-8'))
-
-        # Create Folium map
-        m = folium.Map(
-            location=[34.216, -118.227],
-            zoom_start=13,
-            min_lat=34.20, max_lat=34.27,
-            min_lon=-118.30, max_lon=-118.20,
-            no_wrap=True,
-            control_scale=True,
-            min_zoom=9,
-        )
+                # Upload updated map
+                s3.put_object(
+                    Bucket=bucket_name,
+                    Key=map_key,
+                    Body=html.encode('utf-8'),
+                    ContentType='text/html',
+                    CacheControl='no-cache',
+                    Metadata={FINGERPRINT: inputs}
+                )
+                print("Map updated in S3")
 
-        folium.GeoJson(crescenta_boundaries, name="Crescenta Valley Boundaries").add_to(m)
-        meters = plugins.MarkerCluster().add_to(m)
-
-        for row in deduped_data:
-            coord = row.get('coordinate')
-            if not isinstance(coord, list) or len(coord) != 2:
-                continue
-            lat, lon = coord
-            label = f"Serial Number: {row['serialNumber']}\n\nMeter Value: {row['meterValue']}"
-            folium.Marker(location=[lat, lon], popup=label).add_to(meters)
-
-        # Save and upload updated map
-        m.save("/tmp/crescenta_valley_polygons_with_boundaries.html")
-        with open('/tmp/crescenta_valley_polygons_with_boundaries.html', 'rb') as f:
-            s3.put_object(
-                Bucket=bucket_name,
-                Key='crescenta_valley_polygons_with_boundaries.html',
-                Body=f,
-                ContentType='text/html',
-                CacheControl='no-cache'
-            )
-        print("Map updated in S3")
+        if seq is not None:
+            _debouncer.rendered(seq)
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'Map generated successfully'})
@@ -0,0 +1,149 @@
+"""Map page rendering from a precompiled template, without importing folium.
+
+map_template.json holds the folium map page, rendered once with a placeholder for
+the boundaries and split where the marker scripts go, plus the scripts of a single
+marker. Filling it in gives the same page folium renders, apart from element IDs.
+Regenerate it after changing the map in ``build()`` or upgrading folium:
+
+    python map_template.py
+"""
+import importlib.util
+import json
+import os
+import re
+import secrets
+import string
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map_template.json')
+
+# Loaded on first use and kept for warm invocations
+_template = None
+
+
+def load():
+    global _template
+    if _template is None:
+        with open(TEMPLATE_FILE, encoding='utf-8') as f:
+            raw = json.load(f)
+        installed = installed_folium_version()
+        if installed and installed != raw['folium_version']:
+            print(f"Warning: {os.path.basename(TEMPLATE_FILE)} was built with folium {raw['folium_version']} "
+                  f"but folium {installed} is installed; regenerate it with python map_template.py")
+        _template = {
+            'folium_version': raw['folium_version'],
+            'map': raw['map'],
+            'layer': raw['layer'],
+            'head': string.Template(raw['head']),
+            'tail': string.Template(raw['tail']),
+            'marker': string.Template(raw['marker']),
+        }
+    return _template
+
+
+def installed_folium_version():
+    """Version of the installed folium, read from its metadata so folium isn't imported."""
+    if importlib.util.find_spec('folium') is None:
+        return None
+    from importlib import metadata
+    try:
+        return metadata.version('folium')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def tojson(value):
+    """JSON the way folium's templates embed it (jinja2's ``tojson``)."""
+    return (json.dumps(value, sort_keys=True)
+            .replace('<', '\\u003c').replace('>', '\\u003e')
+            .replace('&', '\\u0026').replace("'", '\\u0027'))
+
+
+def escape_backticks(text):
+    return re.sub(r"(?<!\\)`", r"\`", text)
+
+
+def render_page(boundaries):
+    """``(head, tail, map name, marker layer name)`` of the page; marker scripts go between head and tail."""
+    template = load()
+    return (template['head'].substitute(boundaries=tojson(boundaries)), template['tail'].substitute(),
+            template['map'], template['layer'])
+
+
+def render_markers(rows):
+    """Marker scripts for the page's marker layer, as folium.Marker(location, popup=label) renders them."""
+    marker = load()['marker']
+    prefix = secrets.token_hex(8)
+    scripts = []
+    for i, row in enumerate(rows):
+        coord = row.get('coordinate')
+        if not isinstance(coord, list) or len(coord) != 2:
+            continue
+        label = f"Serial Number: {row['serialNumber']}\n\nMeter Value: {row['meterValue']}"
+        scripts.append(marker.substitute(
+            id=f'{prefix}{i:016x}',
+            location=json.dumps([float(coord[0]), float(coord[1])]),
+            popup=escape_backticks(label).replace('\n', ' ')
+        ))
+    return ''.join(scripts)
+
+
+def build():
+    """Render the map with folium and turn it into the template pieces."""
+    from unittest import mock
+
+    import folium
+    from folium import plugins
+
+    def page(with_marker):
+        # Deterministic element IDs, so the two renders differ only by the marker
+        ids = iter(range(1, 1000))
+        with mock.patch('branca.element.urandom', lambda n: next(ids).to_bytes(n, 'big')):
+            m = folium.Map(
+                location=[34.216, -118.227],
+                zoom_start=13,
+                min_lat=34.20, max_lat=34.27,
+                min_lon=-118.30, max_lon=-118.20,
+                no_wrap=True,
+                control_scale=True,
+                min_zoom=9,
+            )
+            folium.GeoJson(BOUNDARIES_SENTINEL, name="Crescenta Valley Boundaries").add_to(m)
+            meters = plugins.MarkerCluster().add_to(m)
+            if with_marker:
+                folium.Marker(location=[1.5, 2.5], popup=POPUP_SENTINEL).add_to(meters)
+            return m.get_root().render(), m.get_name(), meters.get_name()
+
+    empty, map_name, layer_name = page(False)
+    full, _, _ = page(True)
+    start = next(i for i, (a, b) in enumerate(zip(empty, full)) if a != b)
+    end = len(full) - len(empty) + start
+    assert full[:start] + full[end:] == empty, "renders differ outside the marker"
+
+    marker_names = sorted(set(re.findall(r'\b((?:marker|popup|html)_[0-9a-f]{32})\b', full[start:end])))
+    marker = full[start:end].replace('$', '$$')
+    for name in marker_names:
+        kind, hex_id = name.rsplit('_', 1)
+        marker = marker.replace(name, f'{kind}_${{id}}')
+    marker = marker.replace('[1.5, 2.5]', '$location').replace(POPUP_SENTINEL, '$popup')
+
+    head = empty[:start].replace('$', '$$').replace(tojson(BOUNDARIES_SENTINEL), '$boundaries')
+    assert '$boundaries' in head and '$location' in marker and '$popup' in marker
+    return {
+        'folium_version': folium.__version__,
+        'map': map_name,
+        'layer': layer_name,
+        'head': head,
+        'tail': empty[start:].replace('$', '$$'),
+        'marker': marker,
+    }
+
+
+BOUNDARIES_SENTINEL = {'type': 'FeatureCollection', 'features': [], 'sentinel': 'boundaries'}
+POPUP_SENTINEL = 'popup-sentinel-text'
+
+
+if __name__ == '__main__':
+    with open(TEMPLATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(build(), f, indent=1)
+        f.write('\n')
+    print(f"Wrote {TEMPLATE_FILE}")
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import math
+
+from botocore.exceptions import ClientError
+
+import decimal_json
+
+TILE_PREFIX = 'map-tiles/'
+MANIFEST_KEY = TILE_PREFIX + 'manifest.json'
+TILES_FORMAT = 'water-meter-tiles'
+TILES_VERSION = 1
+
+# Cluster tiles for zooms MIN_ZOOM .. MAX_ZOOM - 1; MAX_ZOOM tiles list single meters
+MIN_ZOOM = 9
+MAX_ZOOM = 17
+
+# Each cluster tile is a 4 x 4 grid of 64 px cells (2 ** CELL_BITS cells per side)
+CELL_BITS = 2
+
+# Decimal places kept for coordinates in the tiles (1e-6 degrees is about 10 cm)
+COORDINATE_PRECISION = 6
+
+
+def tile_xy(lat, lon, level):
+    """Web Mercator tile indices of a point at a zoom level, as Leaflet computes them."""
+    scale = 2 ** level
+    lat = math.radians(lat)
+    x = (lon + 180.0) / 360.0 * scale
+    y = (1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * scale
+    return int(x), int(y)
+
+
+class MarkerTiles:
+    """Per-zoom grid clusters of the latest reading per meter, kept up to date incrementally.
+
+    Meters are indexed by their cell at the finest cluster zoom. Each coarser zoom
+    keeps an aggregate per cell (count, coordinate sums and bounding box) built from
+    its four child cells, so a changed meter only recomputes one cell per zoom and
+    dirties one tile per zoom. Tiles are published as ``map-tiles/{z}/{x}/{y}.json``
+    alongside a manifest of their hashes; only tiles whose content changed are uploaded.
+    """
+
+    def __init__(self, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, prefix=TILE_PREFIX):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.prefix = prefix
+        # Cells of the finest cluster zoom are at this tile level
+        self.finest_level = max_zoom - 1 + CELL_BITS
+
+        self.meters = {}      # serialNumber -> (lat, lon, serialNumber, meterValue)
+        self.cell_of = {}     # serialNumber -> finest cell
+        self.cells = {}       # finest cell -> {serialNumber: meter}
+        self.aggregates = {level: {} for level in range(min_zoom + CELL_BITS, self.finest_level + 1)}
+        # Published tile key -> content hash, read from the manifest on first publish
+        self.hashes = None
+        # Tiles changed by update() and not yet published, kept until a publish completes
+        self.pending = set()
+        # Whether self.hashes has changed since the manifest was last uploaded
+        self.manifest_stale = False
+
+    def update(self, items):
+        """Bring the index in line with ``items`` and return the keys of the tiles that changed.
+
+        The keys are also added to ``pending`` until ``publish`` has uploaded them.
+        """
+        current = {}
+        for item in items:
+            meter = self._meter(item)
+            if meter is not None:
+                current[meter[2]] = meter
+
+        dirty = set()
+        for serial in self.meters.keys() - current.keys():
+            dirty.add(self._remove(serial))
+        for serial, meter in current.items():
+            if self.meters.get(serial) != meter:
+                if serial in self.meters:
+                    dirty.add(self._remove(serial))
+                dirty.add(self._add(meter))
+        tiles = self._refresh(dirty)
+        self.pending |= tiles
+        return tiles
+
+    def render(self, key):
+        """Encoded tile for a ``z/x/y`` key, or None if it has no meters."""
+        zoom, x, y = (int(part) for part in key.split('/'))
+        if zoom == self.max_zoom:
+            shift = self.finest_level - zoom
+            meters = []
+            for cx in range(x << shift, (x + 1) << shift):
+                for cy in range(y << shift, (y + 1) << shift):
+                    meters.extend(self.cells.get((cx, cy), {}).values())
+            if not meters:
+                return None
+            meters.sort(key=lambda meter: meter[2])
+            document = {'meters': [[self._round(lat), self._round(lon), serial, value]
+                                   for lat, lon, serial, value in meters]}
+        else:
+            aggregates = self.aggregates[zoom + CELL_BITS]
+            clusters = []
+            for cx in range(x << CELL_BITS, (x + 1) << CELL_BITS):
+                for cy in range(y << CELL_BITS, (y + 1) << CELL_BITS):
+                    aggregate = aggregates.get((cx, cy))
+                    if aggregate:
+                        count, sum_lat, sum_lon, min_lat, min_lon, max_lat, max_lon = aggregate
+                        clusters.append([self._round(sum_lat / count), self._round(sum_lon / count), count,
+                                         self._round(min_lat), self._round(min_lon),
+                                         self._round(max_lat), self._round(max_lon)])
+            if not clusters:
+                return None
+            document = {'clusters': clusters}
+        return decimal_json.dumps(document, compact=True).encode('utf-8')
+
+    def publish(self, s3, bucket, dirty=()):
+        """Upload the pending tiles that changed, delete emptied ones and update the manifest.
+
+        Tiles stay pending until they and the manifest are uploaded, so a publish that
+        fails partway is completed by the next one even if no meter changed since.
+        """
+        self.pending |= set(dirty)
+        if self.hashes is None:
+            hashes = self._read_manifest(s3, bucket)
+            # A cold index doesn't know which published tiles have since emptied
+            self.pending |= hashes.keys()
+            self.hashes = hashes
+
+        uploaded, deleted = 0, []
+        for key in sorted(self.pending):
+            body = self.render(key)
+            if body is None:
+                if key in self.hashes:
+                    deleted.append(key)
+                continue
+
+            digest = hashlib.md5(body).hexdigest()
+            if self.hashes.get(key) != digest:
+                s3.put_object(
+                    Bucket=bucket,
+                    Key=f'{self.prefix}{key}.json',
+                    Body=body,
+                    ContentType='application/json'
+                )
+                self.hashes[key] = digest
+                self.manifest_stale = True
+                uploaded += 1
+
+        failed = set()
+        for i in range(0, len(deleted), 1000):
+            response = s3.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': f'{self.prefix}{key}.json'} for key in deleted[i:i + 1000]], 'Quiet': True}
+            )
+            failed.update(error['Key'] for error in response.get('Errors', []))
+        for key in deleted:
+            # Tiles that failed to delete stay in the manifest and pending for the next publish
+            if f'{self.prefix}{key}.json' not in failed:
+                del self.hashes[key]
+                self.manifest_stale = True
+
+        if self.manifest_stale:
+            manifest = {
+                'format': TILES_FORMAT,
+                'version': TILES_VERSION,
+                'minZoom': self.min_zoom,
+                'maxZoom': self.max_zoom,
+                'tiles': self.hashes,
+            }
+            s3.put_object(
+                Bucket=bucket,
+                Key=f'{self.prefix}manifest.json',
+                Body=decimal_json.dumps(manifest, compact=True),
+                ContentType='application/json',
+                CacheControl='no-cache'
+            )
+            self.manifest_stale = False
+
+        dirty = len(self.pending)
+        self.pending = {key for key in self.pending if f'{self.prefix}{key}.json' in failed}
+        if failed:
+            print(f"Could not delete {len(failed)} emptied map tiles, retrying at the next publish")
+        return {'dirty': dirty, 'uploaded': uploaded, 'deleted': len(deleted) - len(failed), 'tiles': len(self.hashes)}
+
+    def _meter(self, item):
+        coord = item.get('coordinate')
+        if not isinstance(coord, list) or len(coord) != 2:
+            return None
+        return (float(coord[0]), float(coord[1]), item['serialNumber'], item.get('meterValue'))
+
+    def _add(self, meter):
+        serial = meter[2]
+        cell = tile_xy(meter[0], meter[1], self.finest_level)
+        self.meters[serial] = meter
+        self.cell_of[serial] = cell
+        self.cells.setdefault(cell, {})[serial] = meter
+        return cell
+
+    def _remove(self, serial):
+        del self.meters[serial]
+        cell = self.cell_of.pop(serial)
+        meters = self.cells[cell]
+        del meters[serial]
+        if not meters:
+            del self.cells[cell]
+        return cell
+
+    def _refresh(self, cells):
+        """Recompute the aggregates above the changed finest cells and return the affected tiles."""
+        shift = self.finest_level - self.max_zoom
+        tiles = {f'{self.max_zoom}/{x >> shift}/{y >> shift}' for x, y in cells}
+
+        level = self.finest_level
+        while level >= self.min_zoom + CELL_BITS:
+            aggregates = self.aggregates[level]
+            for cell in cells:
+                if level == self.finest_level:
+                    aggregate = _aggregate_meters(self.cells.get(cell, {}).values())
+                else:
+                    children = self.aggregates[level + 1]
+                    x, y = cell
+                    aggregate = _merge([children.get((2 * x + dx, 2 * y + dy)) for dx in (0, 1) for dy in (0, 1)])
+                if aggregate:
+                    aggregates[cell] = aggregate
+                else:
+                    aggregates.pop(cell, None)
+                tiles.add(f'{level - CELL_BITS}/{cell[0] >> CELL_BITS}/{cell[1] >> CELL_BITS}')
+            cells = {(x >> 1, y >> 1) for x, y in cells}
+            level -= 1
+        return tiles
+
+    def _read_manifest(self, s3, bucket):
+        try:
+            response = s3.get_object(Bucket=bucket, Key=f'{self.prefix}manifest.json')
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return {}
+            raise
+        manifest = json.loads(response['Body'].read().decode('utf-8'))
+        return dict(manifest.get('tiles', {}))
+
+    @staticmethod
+    def _round(value):
+        return round(value, COORDINATE_PRECISION)
+
+
+def _aggregate_meters(meters):
+    aggregate = None
+    for lat, lon, _, _ in meters:
+        if aggregate is None:
+            aggregate = [1, lat, lon, lat, lon, lat, lon]
+        else:
+            aggregate[0] += 1
+            aggregate[1] += lat
+            aggregate[2] += lon
+            aggregate[3] = min(aggregate[3], lat)
+            aggregate[4] = min(aggregate[4], lon)
+            aggregate[5] = max(aggregate[5], lat)
+            aggregate[6] = max(aggregate[6], lon)
+    return aggregate
+
+
+def _merge(aggregates):
+    aggregates = [a for a in aggregates if a]
+    if not aggregates:
+        return None
+    return [
+        sum(a[0] for a in aggregates),
+        sum(a[1] for a in aggregates),
+        sum(a[2] for a in aggregates),
+        min(a[3] for a in aggregates),
+        min(a[4] for a in aggregates),
+        max(a[5] for a in aggregates),
+        max(a[6] for a in aggregates),
+    ]
@@ -1,53 +1,44 @@
 import json
-import boto3
 from boto3.dynamodb.types import TypeDeserializer
-from collections.abc import Mapping, Iterable
-from decimal import Decimal
-
-class DecimalEncoder(json.JSONEncoder):
-    def encode(self, obj):
-        if isinstance(obj, Mapping):
-            return '{' + ', '.join(f'{self.encode(k)}: {self.encode(v)}' for (k, v) in obj.items()) + '}'
-        elif isinstance(obj, Iterable) and not isinstance(obj, str):
-            return '[' + ', '.join(map(self.encode, obj)) + ']'
-        elif isinstance(obj, Decimal):
-            return f'{obj.normalize():f}'
-        else:
-            return super().encode(obj)
-
-dynamodb = boto3.resource('dynamodb')
-MeterTable = dynamodb.Table('WaterMeterTable')
-ReferenceTable = dynamodb.Table('MeterReferenceTable')
+import meter_fanout
+import reference_index
+from reference_index import INSERT, REMOVE, REPLACE
+import aws_runtime
+
+s3 = aws_runtime.client('s3')
+MeterTable = aws_runtime.table('WaterMeterTable')
+ReferenceTable = aws_runtime.table('MeterReferenceTable')
+
+# Invocations in this container that left reference.json unchanged and skipped the write
+skipped_writes = 0
 
 def lambda_handler(event, context):
+    global skipped_writes
     try:
-        s3 = boto3.client('s3')
         bucket_name = 'water-meter-s3-bucket'
         file_name = 'reference.json'
         deserializer = TypeDeserializer()
 
         try:
-            response = s3.get_object(Bucket=bucket_name, Key=file_name)
-            content = response['Body'].read().decode('utf-8')
-            data = json.loads(content)
+            meters, etag = reference_index.load(s3, bucket_name, file_name)
         except Exception as e:
             print("Failed to load reference.json:", str(e))
             raise e
 
-        serial_number = None
-        new_item = None
+        # Every mutation applied to meters, in order, to replay if the write conflicts
+        mutations = []
 
         for record in event['Records']:
+            serial_number = None
+            new_item = None
             try:
                 if record['eventName'] == 'INSERT':
                     try:
                         new_item = {k: deserializer.deserialize(v) for k, v in record['dynamodb']['NewImage'].items()}
                         serial_number = new_item['serialNumber']
 
-                        existing = next((item for item in data if item['serialNumber'] == serial_number), None)
-                        if not existing:
-                            data.append(new_item)
-                        else:
+                        mutations.append((INSERT, new_item))
+                        if not meters.apply(mutations[-1]):
                             print(f"serialNumber {serial_number} already exists in reference.json, skipping append")
 
                     except Exception as e:
@@ -57,21 +48,15 @@ def lambda_handler(event, context):
                     try:
                         old_item = {k: deserializer.deserialize(v) for k, v in record['dynamodb']['OldImage'].items()}
                         serial_number = old_item['serialNumber']
-                        data = [item for item in data if item['serialNumber'] != serial_number]
+                        mutations.append((REMOVE, serial_number))
+                        meters.apply(mutations[-1])
                     except Exception as e:
+                        # Without the image there's no meter to delete the history of
                         print("Failed to process REMOVE event:", str(e))
+                        continue
 
                     try:
-                        response = MeterTable.query(
-                            KeyConditionExpression=boto3.dynamodb.conditions.Key('serialNumber').eq(serial_number)
-                        )
-                        for item in response.get('Items', []):
-                            MeterTable.delete_item(
-                                Key={
-                                    'serialNumber': item['serialNumber'],
-                                    'timestamp': item['timestamp']
-                                }
-                            )
+                        print(meter_fanout.delete_history(MeterTable, serial_number))
                     except Exception as e:
                         print("Failed to delete from MeterTable:", str(e))
 
@@ -79,27 +64,14 @@ def lambda_handler(event, context):
                     try:
                         new_item = {k: deserializer.deserialize(v) for k, v in record['dynamodb']['NewImage'].items()}
                         serial_number = new_item['serialNumber']
-                        data = [new_item if item['serialNumber'] == serial_number else item for item in data]
+                        mutations.append((REPLACE, new_item))
+                        meters.apply(mutations[-1])
                     except Exception as e:
                         print("Failed to process MODIFY event:", str(e))
+                        continue
 
                     try:
-                        response = MeterTable.query(
-                            KeyConditionExpression=boto3.dynamodb.conditions.Key('serialNumber').eq(serial_number)
-                        )
-
-                        for item in response.get('Items', []):
-                            MeterTable.update_item(
-                                Key={
-                                    'serialNumber': item['serialNumber'],
-                                    'timestamp': item['timestamp']
-                                },
-                                UpdateExpression="SET zipcode = :zip, coordinate = :coord",
-                                ExpressionAttributeValues={
-                                    ':zip': new_item['zipcode'],
-                                    ':coord': new_item['coordinate']
-                                }
-                            )
+                        print(meter_fanout.update_history(MeterTable, serial_number, new_item['zipcode'], new_item['coordinate']))
                     except Exception as e:
                         print("Failed to update MeterTable:", str(e))
 
@@ -108,12 +80,13 @@ def lambda_handler(event, context):
                 continue
 
         try:
-            s3.put_object(
-                Bucket=bucket_name,
-                Key=file_name,
-                Body=json.dumps(data, indent=2, cls=DecimalEncoder)
-            )
-            print("reference.json updated in S3")
+            new_etag = reference_index.write_back(s3, bucket_name, meters, etag, mutations, file_name)
+            if new_etag:
+                print("reference.json updated in S3")
+                reference_index.bump_version(s3, bucket_name, new_etag)
+            else:
+                skipped_writes += 1
+                print(f"reference.json unchanged, write skipped ({skipped_writes} skipped by this container)")
         except Exception as e:
             print("Failed to write reference.json to S3:", str(e))
             raise e
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+
+# Concurrent update_item calls per fan-out
+UPDATE_WORKERS = int(os.environ.get('FANOUT_WORKERS', 8))
+
+# Throttled calls are retried by the client itself (aws_runtime's adaptive retry
+# config); a write still failing after those attempts is counted as failed
+
+
+def reading_keys(table, serial_number):
+    """Yield the key of every reading of a meter, following LastEvaluatedKey across pages."""
+    kwargs = {
+        'KeyConditionExpression': Key('serialNumber').eq(serial_number),
+        'ProjectionExpression': '#serial, #ts',
+        'ExpressionAttributeNames': {'#serial': 'serialNumber', '#ts': 'timestamp'},
+    }
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            yield {'serialNumber': item['serialNumber'], 'timestamp': item['timestamp']}
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+class FanoutStats:
+    """Counts for one fan-out; safe to update from the worker threads."""
+
+    def __init__(self, action, serial_number):
+        self.action = action
+        self.serial_number = serial_number
+        self.items = 0
+        self.failed = 0
+        self.retries = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def done(self, ok=True):
+        with self._lock:
+            if ok:
+                self.items += 1
+            else:
+                self.failed += 1
+
+    def retried(self, response):
+        """Count the retries the client made for ``response``."""
+        attempts = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        if attempts:
+            with self._lock:
+                self.retries += attempts
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def items_per_second(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.action} {self.items} MeterTable readings of {self.serial_number} in "
+                f"{self.seconds:.2f}s ({self.items_per_second:.0f} items/s, "
+                f"{self.retries} client retries, {self.failed} failed)")
+
+
+def delete_history(table, serial_number):
+    """Delete every reading of a meter through a batch writer (25 deletes per request).
+
+    The batch writer resends unprocessed items itself.
+    """
+    stats = FanoutStats('Deleted', serial_number)
+    with table.batch_writer(overwrite_by_pkeys=['serialNumber', 'timestamp']) as batch:
+        for key in reading_keys(table, serial_number):
+            batch.delete_item(Key=key)
+            stats.done()
+    return stats.finish()
+
+
+def update_history(table, serial_number, zipcode, coordinate, workers=UPDATE_WORKERS):
+    """Set zipcode and coordinate on every reading of a meter, ``workers`` updates at a time.
+
+    Pages are queried while earlier updates run; at most ``2 * workers`` updates are
+    queued at once. A reading whose update fails is counted in ``failed`` and printed.
+    """
+    stats = FanoutStats('Updated', serial_number)
+    slots = threading.BoundedSemaphore(2 * workers)
+
+    def update(key):
+        try:
+            stats.retried(table.update_item(
+                Key=key,
+                UpdateExpression="SET zipcode = :zip, coordinate = :coord",
+                ExpressionAttributeValues={':zip': zipcode, ':coord': coordinate}
+            ))
+            stats.done()
+        except Exception as e:
+            print(f"Failed to update MeterTable reading {key}:", str(e))
+            stats.done(ok=False)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key in reading_keys(table, serial_number):
+            slots.acquire()
+            pool.submit(update, key)
+    return stats.finish()
@@ -0,0 +1,150 @@
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+import decimal_json
+
+REFERENCE_KEY = 'reference.json'
+# Small object rewritten whenever reference.json changes, so readers caching
+# reference items can tell cheaply that they are out of date
+VERSION_KEY = 'reference-version.json'
+
+WRITE_ATTEMPTS = 5
+# S3 errors for a conditional write that lost to another writer
+CONFLICT_ERRORS = {'PreconditionFailed', 'ConditionalRequestConflict'}
+
+INSERT = 'insert'
+REPLACE = 'replace'
+REMOVE = 'remove'
+
+
+class ReferenceIndex:
+    """reference.json keyed by serialNumber.
+
+    Meters keep the order of reference.json: inserts go to the end and
+    modifications keep their position, the same as the list operations
+    meter-reference-stream-handler used before. A serialNumber appearing more
+    than once in the file keeps its first entry.
+
+    ``changed`` is set once a mutation actually alters the meters; skipped
+    inserts, removes of unknown meters and identical replacements leave it unset.
+    """
+
+    def __init__(self, items=()):
+        self._by_serial = {}
+        for item in items:
+            self._by_serial.setdefault(item['serialNumber'], item)
+        self.changed = False
+
+    @classmethod
+    def from_list(cls, items):
+        return cls(items)
+
+    def to_list(self):
+        """Return the meters in the existing reference.json shape (a list of dicts)."""
+        return list(self._by_serial.values())
+
+    def __len__(self):
+        return len(self._by_serial)
+
+    def __contains__(self, serial_number):
+        return serial_number in self._by_serial
+
+    def get(self, serial_number):
+        return self._by_serial.get(serial_number)
+
+    def insert(self, item):
+        """Append a meter; returns False if its serialNumber is already registered."""
+        serial_number = item['serialNumber']
+        if serial_number in self._by_serial:
+            return False
+        self._by_serial[serial_number] = _as_written(item)
+        self.changed = True
+        return True
+
+    def replace(self, item):
+        """Replace a registered meter in place; returns False if it isn't registered."""
+        serial_number = item['serialNumber']
+        if serial_number not in self._by_serial:
+            return False
+        item = _as_written(item)
+        if self._by_serial[serial_number] != item:
+            self._by_serial[serial_number] = item
+            self.changed = True
+        return True
+
+    def remove(self, serial_number):
+        """Remove a meter; returns the removed entry or None."""
+        removed = self._by_serial.pop(serial_number, None)
+        if removed is not None:
+            self.changed = True
+        return removed
+
+    def apply(self, mutation):
+        """Apply an ``(INSERT | REPLACE, item)`` or ``(REMOVE, serialNumber)`` mutation."""
+        op, value = mutation
+        return getattr(self, op)(value)
+
+
+def _as_written(item):
+    """``item`` as reference.json holds it once written and read back.
+
+    Stream images carry Decimals where the file has ints and floats, and
+    Decimal('34.2') != 34.2, so items are compared in this form.
+    """
+    return json.loads(decimal_json.dumps(item))
+
+
+def load(s3, bucket, key=REFERENCE_KEY):
+    """Read reference.json into a ReferenceIndex; returns it with the ETag it was read at."""
+    response = s3.get_object(Bucket=bucket, Key=key)
+    meters = ReferenceIndex.from_list(json.loads(response['Body'].read().decode('utf-8')))
+    return meters, response.get('ETag')
+
+
+def write_back(s3, bucket, meters, etag, mutations, key=REFERENCE_KEY, attempts=WRITE_ATTEMPTS):
+    """Write ``meters`` over the version read at ``etag``, if the mutations changed anything.
+
+    The write only succeeds if the object is still at ``etag``. When another
+    invocation wrote in between, the current version is read again and
+    ``mutations`` (every mutation applied to ``meters``, in order) are replayed
+    on it before retrying. Returns the new ETag, or None if nothing was written.
+    """
+    for attempt in range(attempts):
+        if not meters.changed:
+            return None
+        try:
+            response = s3.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=decimal_json.dumps(meters.to_list()),
+                IfMatch=etag
+            )
+            return response.get('ETag')
+        except ClientError as e:
+            if e.response['Error']['Code'] not in CONFLICT_ERRORS:
+                raise
+        print(f"{key} was written since it was read, replaying {len(mutations)} changes (attempt {attempt + 1})")
+        meters, etag = load(s3, bucket, key)
+        for mutation in mutations:
+            meters.apply(mutation)
+    raise RuntimeError(f"{key} still conflicting after {attempts} attempts")
+
+
+def bump_version(s3, bucket, reference_etag, key=VERSION_KEY):
+    """Mark the reference set as changed; the marker's ETag changes on every bump."""
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({'referenceEtag': reference_etag, 'updated': time.time()}),
+        ContentType='application/json'
+    )
+
+
+def current_version(s3, bucket, key=VERSION_KEY):
+    """ETag of the version marker, or None if it doesn't exist yet."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key).get('ETag')
+    except ClientError:
+        return None
@@ -0,0 +1,150 @@
+def reading_time(item):
+    return int(item.get('timestamp', 0))
+
+
+def latest_per_meter(items):
+    """Latest reading per serialNumber; on equal timestamps the earlier reading wins."""
+    latest = {}
+    for item in items:
+        serial = item['serialNumber']
+        if serial not in latest or reading_time(item) > reading_time(latest[serial]):
+            latest[serial] = item
+    return list(latest.values())
+
+
+class SnapshotStore:
+    """In-memory copy of df.json keyed by uuid, with a secondary index by serialNumber.
+
+    Readings keep the order of df.json: inserts go to the end and replacements keep
+    their position, the same as the list operations df-updater used before.
+
+    The latest reading of every meter is maintained as readings change, matching
+    ``latest_per_meter`` over the whole list. Removing or back-dating a meter's
+    latest reading falls back to its next newest one.
+    """
+
+    def __init__(self, items=()):
+        self._by_uuid = {}
+        # serialNumber -> {uuid: None}, a dict used as an insertion-ordered set
+        self._by_serial = {}
+        # uuid -> position in df.json order, used to break timestamp ties like the list scan
+        self._position = {}
+        self._next_position = 0
+        # serialNumber -> latest reading, and the serials whose entry changed
+        self._latest = {}
+        self._latest_changed = set()
+        for item in items:
+            self.insert(item)
+
+    @classmethod
+    def from_list(cls, items):
+        return cls(items)
+
+    def to_list(self):
+        """Return the readings in the existing df.json shape (a list of dicts)."""
+        return list(self._by_uuid.values())
+
+    def __len__(self):
+        return len(self._by_uuid)
+
+    def __contains__(self, uuid):
+        return uuid in self._by_uuid
+
+    def __iter__(self):
+        return iter(self._by_uuid.values())
+
+    def get(self, uuid):
+        return self._by_uuid.get(uuid)
+
+    def serials(self):
+        return self._by_serial.keys()
+
+    def readings_for(self, serial_number):
+        """Return every reading of one meter, in df.json order."""
+        uuids = sorted(self._by_serial.get(serial_number, ()), key=self._position.__getitem__)
+        return [self._by_uuid[uid] for uid in uuids]
+
+    def latest_items(self):
+        """Latest reading per meter, one entry per serialNumber."""
+        return list(self._latest.values())
+
+    def pop_latest_changes(self):
+        """Return the serials whose latest reading changed since the last call, and reset."""
+        changed = self._latest_changed
+        self._latest_changed = set()
+        return changed
+
+    def insert(self, item):
+        uid = item['uuid']
+        serial = item.get('serialNumber')
+        old = self._by_uuid.get(uid)
+        self._by_uuid[uid] = item
+
+        if old is None:
+            self._position[uid] = self._next_position
+            self._next_position += 1
+            self._by_serial.setdefault(serial, {})[uid] = None
+            # A new reading is last in order, so it only wins on a strictly newer timestamp
+            current = self._latest.get(serial)
+            if current is None or reading_time(item) > reading_time(current):
+                self._set_latest(serial, item)
+        elif old.get('serialNumber') != serial:
+            self._unindex(uid, old)
+            self._by_serial.setdefault(serial, {})[uid] = None
+            self._refresh_latest(serial)
+        elif self._latest.get(serial) is old:
+            # Still the latest unless it was back-dated
+            if reading_time(item) >= reading_time(old):
+                self._set_latest(serial, item)
+            else:
+                self._refresh_latest(serial)
+        elif self._newer(item, self._latest[serial]):
+            self._set_latest(serial, item)
+
+    def replace(self, item):
+        """Replace the reading with the same uuid. Returns False if it isn't stored."""
+        uid = item['uuid']
+        if uid not in self._by_uuid:
+            return False
+        self.insert(item)
+        return True
+
+    def delete(self, uuid):
+        """Remove a reading by uuid and return it, or None if it isn't stored."""
+        old = self._by_uuid.pop(uuid, None)
+        if old is not None:
+            self._unindex(uuid, old)
+            del self._position[uuid]
+        return old
+
+    def _unindex(self, uuid, item):
+        serial = item.get('serialNumber')
+        uuids = self._by_serial.get(serial)
+        if uuids is None:
+            return
+        uuids.pop(uuid, None)
+        if not uuids:
+            del self._by_serial[serial]
+        if self._latest.get(serial) is item:
+            self._refresh_latest(serial)
+
+    def _newer(self, item, other):
+        item_time, other_time = reading_time(item), reading_time(other)
+        if item_time != other_time:
+            return item_time > other_time
+        return self._position[item['uuid']] < self._position[other['uuid']]
+
+    def _refresh_latest(self, serial):
+        # Only this meter's readings are scanned, not the whole history
+        uuids = self._by_serial.get(serial)
+        if uuids:
+            uid = max(uuids, key=lambda u: (reading_time(self._by_uuid[u]), -self._position[u]))
+            self._set_latest(serial, self._by_uuid[uid])
+        elif serial in self._latest:
+            del self._latest[serial]
+            self._latest_changed.add(serial)
+
+    def _set_latest(self, serial, item):
+        if self._latest.get(serial) is not item:
+            self._latest[serial] = item
+            self._latest_changed.add(serial)
@@ -0,0 +1,66 @@
+import time
+
+# SendMessageBatch limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class BatchSendError(RuntimeError):
+    """Entries couldn't be sent in order; the caller should fail so its input is sent again."""
+
+
+def pack_entries(entries, max_entries=MAX_BATCH_ENTRIES, max_bytes=MAX_BATCH_BYTES):
+    """Split entries, in order, into batches within the entry count and payload limits."""
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        size = len(entry['MessageBody'].encode('utf-8'))
+        if batch and (len(batch) == max_entries or batch_bytes + size > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def send_batched(sqs, queue_url, entries, max_entries=MAX_BATCH_ENTRIES, max_bytes=MAX_BATCH_BYTES):
+    """Send entries with as few send_message_batch calls as possible.
+
+    Entries are sent in order. When the entries that fail are the tail of a batch,
+    they are retried with backoff before the next batch goes out, so the order is
+    kept. If an entry fails before one that succeeded, resending it would put it
+    behind that entry, so BatchSendError is raised instead, as it is when entries
+    still fail after the retries. Give FIFO entries a MessageDeduplicationId so a
+    resent entry that already landed is dropped by SQS.
+    Raises RuntimeError if entries fail because of the request itself.
+    Returns the number of send_message_batch calls made.
+    """
+    calls = 0
+    for batch in pack_entries(entries, max_entries, max_bytes):
+        pending = [dict(entry, Id=str(i)) for i, entry in enumerate(batch)]
+        for attempt in range(RETRY_ATTEMPTS):
+            response = sqs.send_message_batch(QueueUrl=queue_url, Entries=pending)
+            calls += 1
+            failed = response.get('Failed', [])
+            if not failed:
+                break
+
+            sender_faults = [f for f in failed if f.get('SenderFault')]
+            if sender_faults:
+                raise RuntimeError(f"SQS rejected {len(sender_faults)} entries: {sender_faults[0].get('Message')}")
+
+            failed_ids = {f['Id'] for f in failed}
+            tail = pending[len(pending) - len(failed_ids):]
+            if {entry['Id'] for entry in tail} != failed_ids:
+                raise BatchSendError(f"{len(failed_ids)} SQS entries failed ahead of entries that were sent")
+            pending = tail
+            print(f"Retrying {len(pending)} failed SQS entries (attempt {attempt + 1})")
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        else:
+            raise BatchSendError(f"{len(pending)} SQS entries still failing after {RETRY_ATTEMPTS} attempts")
+    return calls
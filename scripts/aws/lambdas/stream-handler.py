@@ -1,29 +1,25 @@
 import json
-import boto3
 from boto3.dynamodb.types import TypeDeserializer
-from collections.abc import Mapping, Iterable
-from decimal import Decimal
 from datetime import datetime
+import decimal_json
+from sqs_batch import BatchSendError, send_batched
+from stream_coalesce import coalesce_records
+import aws_runtime
 
-class DecimalEncoder(json.JSONEncoder):
-    def encode(self, obj):
-        if isinstance(obj, Mapping):
-            return '{' + ', '.join(f'{self.encode(k)}: {self.encode(v)}' for (k, v) in obj.items()) + '}'
-        elif isinstance(obj, Iterable) and (not isinstance(obj, str)):
-            return '[' + ', '.join(map(self.encode, obj)) + ']'
-        elif isinstance(obj, Decimal):
-            return f'{obj.normalize():f}'  # Removes trailing 0s, prevents scientific notation
-        else:
-            return super().encode(obj)
-
-sqs = boto3.client('sqs')
+sqs = aws_runtime.client('sqs')
 queue_url = "https://sqs.us-west-1.amazonaws.com/<account_id>/df-update-queue.fifo"
 
 def lambda_handler(event, context):
     try:
         deserializer = TypeDeserializer()
 
-        for record in event['Records']:
+        # Forward only the net effect per item so intermediate images don't each cost a df.json update
+        records, stats = coalesce_records(event['Records'])
+        print(f"Coalesced {stats['received']} stream records into {stats['forwarded']} "
+              f"({stats['folded']} folded, {stats['cancelled']} cancelled out)")
+
+        entries = []
+        for record in records:
             event_type = record['eventName']
             old_item = None
             new_item = None
@@ -33,21 +29,33 @@ def lambda_handler(event, context):
             if 'OldImage' in record['dynamodb']:
                 old_item = {k: deserializer.deserialize(v) for k, v in record['dynamodb']['OldImage'].items()}
 
-            sqs.send_message(
-                QueueUrl=queue_url,
-                MessageBody=json.dumps({
+            entry = {
+                "MessageBody": decimal_json.dumps({
                     "eventType": event_type,
                     "newItem": new_item,
                     "oldItem": old_item
-                }, cls=DecimalEncoder),
-                MessageGroupId="df-update"
-            )
+                }),
+                "MessageGroupId": "df-update"
+            }
+            # Lets SQS drop entries resent by a retry or a replayed stream batch
+            if record.get('eventID'):
+                entry["MessageDeduplicationId"] = record['eventID']
+            entries.append(entry)
+
+        calls = send_batched(sqs, queue_url, entries)
+        print(f"Forwarded {len(entries)} stream records in {calls} SQS calls")
 
         return {
             "statusCode": 200,
-            "body": json.dumps({"message": "Stream processing successful"})
+            "body": json.dumps({"message": "Stream processing successful", "coalescing": stats})
         }
 
+    except BatchSendError as e:
+        # Fail the invocation so Lambda retries the stream batch; entries that were
+        # already sent are dropped by SQS as duplicates
+        print("Error in Lambda:", str(e))
+        raise
+
     except Exception as e:
         print("Error in Lambda:", str(e))
         return {
@@ -0,0 +1,70 @@
+import json
+
+
+def coalesce_records(records):
+    """Collapse the DynamoDB stream records of one batch to their net effect per item key.
+
+    Returns ``(records, stats)``. Records for the same primary key (``dynamodb.Keys``)
+    are folded in order:
+
+    - INSERT + MODIFY  -> INSERT of the final image
+    - INSERT + REMOVE  -> nothing
+    - MODIFY + MODIFY  -> MODIFY from the first old image to the last new image
+    - MODIFY + REMOVE  -> REMOVE of the first old image
+    - REMOVE + INSERT  -> MODIFY from the removed image to the inserted one
+
+    Each surviving record keeps the eventID of the last record folded into it, so a
+    retried batch coalesces to the same ids. Keys keep the position of their first
+    record; records without Keys pass through untouched.
+    """
+    pending = {}
+    for position, record in enumerate(records):
+        keys = record.get('dynamodb', {}).get('Keys')
+        key = json.dumps(keys, sort_keys=True) if keys else position
+        if key in pending:
+            pending[key] = _fold(pending[key], record)
+        else:
+            pending[key] = record
+
+    coalesced = [record for record in pending.values() if record is not None]
+    stats = {
+        'received': len(records),
+        'forwarded': len(coalesced),
+        'folded': len(records) - len(coalesced),
+        'cancelled': sum(1 for record in pending.values() if record is None),
+    }
+    return coalesced, stats
+
+
+def _fold(first, second):
+    if first is None:
+        return second
+
+    first_type = first['eventName']
+    second_type = second['eventName']
+    old_image = first['dynamodb'].get('OldImage')
+    new_image = second['dynamodb'].get('NewImage')
+
+    if first_type == 'INSERT' and second_type == 'REMOVE':
+        return None
+    if first_type == 'INSERT':
+        return _record(second, 'INSERT', None, new_image)
+    if first_type == 'MODIFY' and second_type == 'REMOVE':
+        return _record(second, 'REMOVE', old_image, None)
+    if first_type == 'MODIFY':
+        return _record(second, 'MODIFY', old_image, new_image)
+    if first_type == 'REMOVE' and second_type == 'INSERT':
+        return _record(second, 'MODIFY', old_image, new_image)
+    # REMOVE followed by anything else can't be reduced further
+    return second
+
+
+def _record(template, event_name, old_image, new_image):
+    record = dict(template, eventName=event_name)
+    dynamodb = {k: v for k, v in template['dynamodb'].items() if k not in ('OldImage', 'NewImage')}
+    if old_image is not None:
+        dynamodb['OldImage'] = old_image
+    if new_image is not None:
+        dynamodb['NewImage'] = new_image
+    record['dynamodb'] = dynamodb
+    return record
@@ -1,8 +1,9 @@
+import http.client
 import json
-import urllib.parse
-import urllib.request
-import boto3
 import os
+import socket
+import ssl
+import urllib.parse
 
 # Get environment variables
 cognito_domain = os.environ['COGNITO_DOMAIN']
@@ -10,50 +11,115 @@ client_id = os.environ['CLIENT_ID']
 client_secret = os.environ['CLIENT_SECRET']
 redirect_uri = os.environ['REDIRECT_URI']
 
+# Seconds allowed for connecting to Cognito (TCP and TLS) and for each read of its response
+CONNECT_TIMEOUT = float(os.environ.get('TOKEN_CONNECT_TIMEOUT', 3))
+READ_TIMEOUT = float(os.environ.get('TOKEN_READ_TIMEOUT', 5))
+
+TOKEN_PATH = '/oauth2/token'
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': redirect_uri,
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'POST,OPTIONS'
+}
+
+# Errors from using a keep-alive connection Cognito has already closed; writing to a
+# closed TLS connection raises SSLEOFError rather than a reset or broken pipe
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, ssl.SSLEOFError)
+
+# Kept open across warm invocations, so only the first login in a container pays for
+# the TCP and TLS handshakes
+_ssl_context = ssl.create_default_context()
+_connection = None
+
+
+def connect():
+    """The open connection to Cognito, and whether it was already used; opens one if needed."""
+    global _connection
+    if _connection is not None:
+        return _connection, True
+    connection = http.client.HTTPSConnection(cognito_domain, timeout=CONNECT_TIMEOUT, context=_ssl_context)
+    connection.connect()
+    connection.sock.settimeout(READ_TIMEOUT)
+    _connection = connection
+    return connection, False
+
+
+def close():
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def request_tokens(params):
+    """POST a grant to Cognito's token endpoint and return ``(status, response body)``.
+
+    A request that fails because Cognito closed the reused connection is sent again
+    on a new one. Any other failure drops the connection and is raised; timeouts
+    aren't retried, since Cognito may already have used the grant.
+    """
+    body = urllib.parse.urlencode(params)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    while True:
+        reused = False
+        try:
+            connection, reused = connect()
+            connection.request('POST', TOKEN_PATH, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except STALE_CONNECTION_ERRORS:
+            close()
+            if reused:
+                print("Cognito closed the kept-alive connection, reconnecting")
+                continue
+            raise
+        except (socket.timeout, http.client.HTTPException, OSError):
+            close()
+            raise
+        if response.will_close:
+            close()
+        return response.status, data
+
+
 def lambda_handler(event, context):
     try:
-        # Get the authorization code from the request
         body = json.loads(event['body'])
-        code = body['code']
-
-        # Prepare the token request
-        token_url = f'https://{cognito_domain}/oauth2/token'
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
 
-        data = urllib.parse.urlencode({
-            'grant_type': 'authorization_code',
-            'client_id': client_id,
-            'client_secret': client_secret,
-            'code': code,
-            'redirect_uri': redirect_uri
-        }).encode('ascii')
+        if 'refresh_token' in body:
+            # Renews the session's ID and access tokens without sending the user back to the login page
+            params = {
+                'grant_type': 'refresh_token',
+                'client_id': client_id,
+                'client_secret': client_secret,
+                'refresh_token': body['refresh_token']
+            }
+        else:
+            # Exchange the authorization code from the login redirect
+            params = {
+                'grant_type': 'authorization_code',
+                'client_id': client_id,
+                'client_secret': client_secret,
+                'code': body['code'],
+                'redirect_uri': redirect_uri
+            }
 
-        # Make the request to Cognito
-        req = urllib.request.Request(token_url, data=data, headers=headers, method='POST')
-        response = urllib.request.urlopen(req)
+        status, data = request_tokens(params)
 
-        # Parse and return the tokens
-        tokens = json.loads(response.read().decode('utf-8'))
+        # Parse and return the tokens, or Cognito's error (e.g. invalid_grant) with its status
+        tokens = json.loads(data.decode('utf-8'))
+        if status != 200:
+            print(f"Cognito rejected the {params['grant_type']} grant with {status}: {tokens.get('error')}")
 
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': redirect_uri,
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'POST,OPTIONS'
-            },
+            'statusCode': status,
+            'headers': CORS_HEADERS,
             'body': json.dumps(tokens)
         }
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
             'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': redirect_uri,
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'POST,OPTIONS'
-            },
+            'headers': CORS_HEADERS,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
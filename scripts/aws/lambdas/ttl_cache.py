@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ``ttl`` seconds after they were stored.
+
+    Storing None caches a negative result ("doesn't exist") for ``negative_ttl``
+    seconds instead, so repeated lookups of an unknown key don't all go to the
+    backing store while a newly created one still shows up soon.
+    ``clock`` returns seconds and can be replaced for local simulations.
+    """
+
+    def __init__(self, max_entries, ttl, negative_ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Whether ``key`` has an entry, expired or not; doesn't count as a lookup."""
+        return key in self._entries
+
+    def get(self, key):
+        """Return ``(hit, value)``; ``value`` is None for a miss or a cached negative result."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            del self._entries[key]
+            self.expired += 1
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.invalidations += 1
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return (f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), {len(self)} cached, "
+                f"{self.expired} expired, {self.evictions} evicted, {self.invalidations} invalidations")
@@ -1,23 +1,32 @@
 import json
-import boto3
 import os
 import re
+import time
 from datetime import datetime
 from decimal import Decimal
-from collections.abc import Mapping, Iterable
 from boto3.dynamodb.conditions import Key
 import uuid
-
-class DecimalEncoder(json.JSONEncoder):
-    def encode(self, obj):
-        if isinstance(obj, Mapping):
-            return '{' + ', '.join(f'{self.encode(k)}: {self.encode(v)}' for (k, v) in obj.items()) + '}'
-        elif isinstance(obj, Iterable) and (not isinstance(obj, str)):
-            return '[' + ', '.join(map(self.encode, obj)) + ']'
-        elif isinstance(obj, Decimal):
-            return f'{obj.normalize():f}'  # Removes trailing 0s, prevents scientific notation
-        else:
-            return super().encode(obj)
+import decimal_json
+import aws_runtime
+import reference_index
+from ttl_cache import TTLCache
+
+# Reference items are cached in the warm container, keyed by serialNumber. Changes are
+# picked up through the version marker; the TTL only bounds staleness if a bump is missed.
+REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', 10000))
+REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', 3600))
+# Unknown serial numbers are remembered for a shorter time so new registrations show up quickly
+REFERENCE_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_NEGATIVE_TTL_SECONDS', 30))
+# How often the reference-version marker is checked; a change clears the cache. Each check
+# is a HEAD request, slower than the get_item a hit saves, so keep it well apart.
+REFERENCE_VERSION_CHECK_SECONDS = float(os.environ.get('REFERENCE_VERSION_CHECK_SECONDS', 60))
+
+# Bulk submissions ({"readings": [...]}) accept at most this many readings per request
+BULK_MAX_READINGS = int(os.environ.get('BULK_MAX_READINGS', 1000))
+# BatchGetItem limit, and retries for keys it returns unprocessed
+BATCH_GET_LIMIT = 100
+BATCH_GET_ATTEMPTS = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
 
 def is_valid_zip(zipcode):
     """Check if ZIP code is exactly 5 digits."""
@@ -27,9 +36,167 @@ def is_valid_date(date):
     """Check if the date is in YYYY-MM-DD format."""
     return bool(re.fullmatch(r"^\d{4}-\d{2}-\d{2}$", date))
 
-dynamodb = boto3.resource("dynamodb")
-MeterTable = dynamodb.Table("WaterMeterTable")
-ReferenceTable = dynamodb.Table("MeterReferenceTable")
+dynamodb = aws_runtime.resource("dynamodb")
+MeterTable = aws_runtime.table("WaterMeterTable")
+ReferenceTable = aws_runtime.table("MeterReferenceTable")
+s3 = aws_runtime.client("s3")
+bucket_name = "water-meter-s3-bucket"
+
+reference_cache = TTLCache(REFERENCE_CACHE_SIZE, REFERENCE_CACHE_TTL_SECONDS, REFERENCE_CACHE_NEGATIVE_TTL_SECONDS)
+_reference_version = {'etag': None, 'checked_at': None}
+
+def check_reference_version():
+    """Clear the reference cache if the version marker changed since it was last checked."""
+    now = time.monotonic()
+    if _reference_version['checked_at'] is not None and now - _reference_version['checked_at'] < REFERENCE_VERSION_CHECK_SECONDS:
+        return
+    _reference_version['checked_at'] = now
+    etag = reference_index.current_version(s3, bucket_name)
+    if etag != _reference_version['etag']:
+        if len(reference_cache):
+            print(f"Reference version changed, clearing {len(reference_cache)} cached reference items")
+            reference_cache.clear()
+        _reference_version['etag'] = etag
+
+def get_reference(serial_number):
+    """Reference item for a serial number (None if unregistered), from the cache when possible."""
+    start = time.perf_counter()
+    # Only a cached entry can be stale; a miss reads the table anyway
+    if serial_number in reference_cache:
+        check_reference_version()
+    hit, item = reference_cache.get(serial_number)
+    if not hit:
+        item = ReferenceTable.get_item(Key={'serialNumber': serial_number}).get('Item') or None
+        reference_cache.put(serial_number, item)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Reference lookup for {serial_number}: {'hit' if hit else 'miss'} in {elapsed_ms:.2f} ms ({reference_cache})")
+    return item
+
+def batch_get_references(serial_numbers):
+    """Reference items for up to BATCH_GET_LIMIT distinct serial numbers, retrying unprocessed keys."""
+    request = {ReferenceTable.name: {'Keys': [{'serialNumber': serial} for serial in serial_numbers]}}
+    items = {}
+    for attempt in range(BATCH_GET_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(ReferenceTable.name, []):
+            items[item['serialNumber']] = item
+        request = response.get('UnprocessedKeys')
+        if not request:
+            return items
+        time.sleep(BATCH_GET_BACKOFF_SECONDS * 2 ** attempt)
+    raise RuntimeError(f"Reference lookups still unprocessed after {BATCH_GET_ATTEMPTS} attempts")
+
+def get_references(serial_numbers):
+    """Reference items for many serial numbers as {serialNumber: item or None}.
+
+    Cached entries are used as in get_reference; the rest are read with BatchGetItem.
+    """
+    start = time.perf_counter()
+    serial_numbers = list(dict.fromkeys(serial_numbers))
+    if any(serial in reference_cache for serial in serial_numbers):
+        check_reference_version()
+
+    references, missing = {}, []
+    for serial in serial_numbers:
+        hit, item = reference_cache.get(serial)
+        if hit:
+            references[serial] = item
+        else:
+            missing.append(serial)
+
+    for i in range(0, len(missing), BATCH_GET_LIMIT):
+        chunk = missing[i:i + BATCH_GET_LIMIT]
+        items = batch_get_references(chunk)
+        for serial in chunk:
+            references[serial] = items.get(serial)
+            reference_cache.put(serial, references[serial])
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Reference lookup for {len(serial_numbers)} serial numbers: {len(missing)} read in "
+          f"{-(-len(missing) // BATCH_GET_LIMIT)} batches, {elapsed_ms:.2f} ms ({reference_cache})")
+    return references
+
+def build_item(body, reference_item):
+    """Validate a reading against its reference item; returns (MeterTable item, None) or (None, error)."""
+    serial_number = body.get('serialNumber')
+    if not reference_item:
+        return None, f"Serial Number, {serial_number}, not found. Please register new meter"
+
+    zipcode = reference_item.get('zipcode')
+    coordinate = reference_item.get('coordinate')
+    meter_value = body.get('meterValue')
+    date = body.get('date')
+
+    if not all([serial_number, meter_value, date, zipcode, coordinate]):  # Ensure all fields exist
+        return None, "Missing required fields"
+
+    if not isinstance(meter_value, (int, float, Decimal)):  # Ensure it's a number
+        return None, "Invalid meterValue. Must be a number."
+
+    if not is_valid_date(date):  # Ensure date is YYYY-MM-DD
+        return None, "Invalid date format. Use YYYY-MM-DD."
+
+    item = {
+        'uuid': str(uuid.uuid4()),
+        'serialNumber': str(serial_number),
+        'meterValue': Decimal(str(meter_value)),
+        'zipcode': str(zipcode),
+        'date': str(date),
+        'timestamp': int(datetime.utcnow().timestamp()),
+        'coordinate': [Decimal(str(coord)) for coord in coordinate]
+    }
+    return item, None
+
+def insert_bulk(readings):
+    """Validate and insert many readings at once, returning a per-reading result."""
+    if not isinstance(readings, list) or not readings:
+        return {"statusCode": 400, "body": json.dumps({"error": "readings must be a non-empty list"})}
+    if len(readings) > BULK_MAX_READINGS:
+        return {"statusCode": 400, "body": json.dumps(
+            {"error": f"Too many readings, at most {BULK_MAX_READINGS} per request"})}
+
+    readings = [reading if isinstance(reading, dict) else {} for reading in readings]
+    references = get_references(
+        reading['serialNumber'] for reading in readings if isinstance(reading.get('serialNumber'), str)
+    )
+
+    results = []
+    # serialNumber -> (index, item); readings share a timestamp, so a later reading of
+    # the same meter would overwrite an earlier one, as it does for single submissions
+    # in the same second
+    latest = {}
+    for index, reading in enumerate(readings):
+        serial_number = reading.get('serialNumber')
+        reference_item = references.get(serial_number) if isinstance(serial_number, str) else None
+        item, error = build_item(reading, reference_item)
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        if item['serialNumber'] in latest:
+            earlier = latest[item['serialNumber']][0]
+            results[earlier] = {'index': earlier, 'status': 'error',
+                                'error': "Superseded by a later reading of the same meter in this request"}
+        latest[item['serialNumber']] = (index, item)
+        results.append({'index': index, 'status': 'inserted', 'uuid': item['uuid'],
+                        'serialNumber': item['serialNumber'], 'timestamp': item['timestamp']})
+    items = [item for _, item in latest.values()]
+
+    start = time.perf_counter()
+    with MeterTable.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {len(items)} of {len(readings)} readings in {elapsed:.2f}s")
+
+    return {
+        'statusCode': 200 if len(items) == len(readings) else 207,
+        'body': json.dumps({
+            'message': f"{len(items)} of {len(readings)} readings inserted",
+            'inserted': len(items),
+            'failed': len(readings) - len(items),
+            'results': results
+        })
+    }
 
 def lambda_handler(event, context):
     try:
@@ -39,46 +206,24 @@ def lambda_handler(event, context):
         if not body:
             return {"statusCode": 400, "body": json.dumps({"error": "Empty body"})}
 
+        if isinstance(body, dict) and 'readings' in body:
+            return insert_bulk(body['readings'])
+
         serial_number = body.get('serialNumber')
-        reference_response = ReferenceTable.get_item(Key={'serialNumber': serial_number})
-        reference_item = reference_response.get('Item', {})
-
-        if not reference_item:
-            return {"statusCode": 400, "body": json.dumps(
-                {"error": f"Serial Number, {serial_number}, not found. Please register new meter"})}
-
-        zipcode = reference_item.get('zipcode')
-        coordinate = reference_item.get('coordinate')
-        meter_value = body.get('meterValue')
-        date = body.get('date')
-
-        if not all([serial_number, meter_value, date, zipcode, coordinate]):  # Ensure all fields exist
-            return {"statusCode": 400, "body": json.dumps({"error": "Missing required fields"})}
-
-        if not isinstance(meter_value, (int, float, Decimal)):  # Ensure it's a number
-            return {"statusCode": 400, "body": json.dumps({"error": "Invalid meterValue. Must be a number."})}
-
-        if not is_valid_date(date):  # Ensure date is YYYY-MM-DD
-            return {"statusCode": 400, "body": json.dumps({"error": "Invalid date format. Use YYYY-MM-DD."})}
-
-        item = {
-            'uuid': str(uuid.uuid4()),
-            'serialNumber': str(serial_number),
-            'meterValue': Decimal(str(meter_value)),
-            'zipcode': str(zipcode),
-            'date': str(date),
-            'timestamp': int(datetime.utcnow().timestamp()),
-            'coordinate': [Decimal(str(coord)) for coord in coordinate]
-        }
+        reference_item = get_reference(serial_number)
+
+        item, error = build_item(body, reference_item)
+        if error:
+            return {"statusCode": 400, "body": json.dumps({"error": error})}
 
         MeterTable.put_item(Item=item)
 
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': decimal_json.dumps({
                 'message': 'Item inserted successfully',
                 'body': item
-            }, cls=DecimalEncoder)
+            })
         }
 
     except Exception as e:
@@ -1,9 +1,12 @@
 import json
-import boto3
+import os
+import time
 import uuid
 from decimal import Decimal
 from datetime import datetime
 import re
+from botocore.exceptions import ClientError
+import aws_runtime
 
 def is_valid_zip(zipcode):
     return bool(re.fullmatch(r"^\d{5}$", zipcode))
@@ -12,9 +15,171 @@ def is_valid_zip(zipcode):
 def is_valid_date(date):
     return bool(re.fullmatch(r"^\d{4}-\d{2}-\d{2}$", date))
 
-dynamodb = boto3.resource('dynamodb')
-meter_table = dynamodb.Table('WaterMeterTable')
-reference_table = dynamodb.Table('MeterReferenceTable')
+dynamodb = aws_runtime.resource('dynamodb')
+meter_table = aws_runtime.table('WaterMeterTable')
+reference_table = aws_runtime.table('MeterReferenceTable')
+
+# Bulk onboarding ({"meters": [...]}) accepts at most this many meters per request
+BULK_MAX_METERS = int(os.environ.get('BULK_MAX_METERS', 1000))
+# Each meter is two Puts and a transaction holds at most 100 actions
+TRANSACTION_METERS = 50
+TRANSACTION_ATTEMPTS = 4
+TRANSACTION_BACKOFF_SECONDS = 0.05
+
+def build_items(body):
+    """Validate a registration; returns (reading item, reference item, None) or (None, None, error)."""
+    serial_number = body.get('serialNumber', None)
+    zipcode = body.get('zipcode', None)
+    meter_value = body.get('meterValue', None)
+    date = body.get('date', None)
+    coordinate = body.get('coordinate', None)
+
+    if not all([serial_number, meter_value, date, zipcode, coordinate]):  # Ensure all fields exist
+        return None, None, "Missing required fields"
+
+    if not isinstance(meter_value, (int, float, Decimal)):  # Ensure it's a number
+        return None, None, "Invalid meterValue. Must be a number."
+
+    if not is_valid_zip(zipcode):  # Ensure ZIP code is 5 digits
+        return None, None, "Invalid zipCode. Must be 5 digits."
+
+    if not is_valid_date(date):  # Ensure date is YYYY-MM-DD
+        return None, None, "Invalid date format. Use YYYY-MM-DD."
+
+    item = {
+        'uuid': str(uuid.uuid4()),
+        'serialNumber': str(serial_number),
+        'meterValue': Decimal(str(meter_value)),
+        'zipcode': str(zipcode),
+        'date': str(date),
+        'timestamp': int(datetime.utcnow().timestamp()),
+        'coordinate': [Decimal(str(coord)) for coord in coordinate]
+    }
+
+    reference_item = {
+        'serialNumber': item['serialNumber'],
+        'zipcode': item['zipcode'],
+        'coordinate': item['coordinate']
+    }
+    return item, reference_item, None
+
+def register_actions(item, reference_item):
+    """Transaction actions registering one meter, cancelled if its serial number already exists."""
+    return [
+        {'Put': {
+            'TableName': reference_table.name,
+            'Item': reference_item,
+            'ConditionExpression': 'attribute_not_exists(serialNumber)'
+        }},
+        {'Put': {
+            'TableName': meter_table.name,
+            'Item': item,
+            'ConditionExpression': 'attribute_not_exists(serialNumber)'
+        }}
+    ]
+
+def cancellation_codes(error):
+    """Per-action reasons of a cancelled transaction, or None for any other error."""
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return None
+    return [reason.get('Code') for reason in error.response.get('CancellationReasons', [])]
+
+def register(item, reference_item):
+    """Write both items in one transaction; returns False if the serial number is already registered."""
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=register_actions(item, reference_item))
+        return True
+    except ClientError as e:
+        if 'ConditionalCheckFailed' in (cancellation_codes(e) or []):
+            return False
+        raise
+
+def register_chunk(entries):
+    """Register up to TRANSACTION_METERS (index, item, reference item) entries in one transaction.
+
+    Meters that already exist cancel the transaction; they are reported and the
+    rest retried without them. If the transaction keeps failing for another reason
+    (e.g. contention), each remaining meter gets its own transaction.
+    Returns ({index: (status, error)}, transactions sent).
+    """
+    results, pending, transactions, failures = {}, list(entries), 0, 0
+    while pending and failures < TRANSACTION_ATTEMPTS:
+        actions = [action for _, item, reference_item in pending for action in register_actions(item, reference_item)]
+        transactions += 1
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=actions)
+        except ClientError as e:
+            codes = cancellation_codes(e)
+            if codes is None:
+                raise
+            # Two actions per meter, in pending order
+            existing = {pending[i // 2][0] for i, code in enumerate(codes) if code == 'ConditionalCheckFailed'}
+            if existing:
+                for index in existing:
+                    results[index] = ('exists', None)
+                pending = [entry for entry in pending if entry[0] not in existing]
+            else:
+                failures += 1
+                time.sleep(TRANSACTION_BACKOFF_SECONDS * 2 ** failures)
+            continue
+        for index, _, _ in pending:
+            results[index] = ('registered', None)
+        pending = []
+
+    for index, item, reference_item in pending:
+        transactions += 1
+        try:
+            results[index] = ('registered', None) if register(item, reference_item) else ('exists', None)
+        except Exception as e:
+            results[index] = ('error', str(e))
+    return results, transactions
+
+def register_bulk(meters):
+    """Register many meters, e.g. from a utility's asset list, returning a per-meter result."""
+    if not isinstance(meters, list) or not meters:
+        return {'statusCode': 400, 'body': json.dumps({'error': 'meters must be a non-empty list'})}
+    if len(meters) > BULK_MAX_METERS:
+        return {'statusCode': 400, 'body': json.dumps({'error': f'Too many meters, at most {BULK_MAX_METERS} per request'})}
+
+    start = time.perf_counter()
+    results, entries, seen = [], [], set()
+    for index, body in enumerate(meters):
+        item, reference_item, error = build_items(body if isinstance(body, dict) else {})
+        if not error and item['serialNumber'] in seen:
+            # A transaction can't write the same item twice
+            error = "Duplicate serialNumber in this request"
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        seen.add(item['serialNumber'])
+        entries.append((index, item, reference_item))
+        results.append({'index': index, 'serialNumber': item['serialNumber']})
+
+    transactions = 0
+    for i in range(0, len(entries), TRANSACTION_METERS):
+        chunk_results, sent = register_chunk(entries[i:i + TRANSACTION_METERS])
+        transactions += sent
+        for index, (status, error) in chunk_results.items():
+            results[index]['status'] = status
+            if status == 'exists':
+                results[index]['error'] = f"Serial number {results[index]['serialNumber']} already exists"
+            elif error:
+                results[index]['error'] = error
+
+    registered = sum(1 for result in results if result['status'] == 'registered')
+    elapsed = time.perf_counter() - start
+    print(f"Registered {registered} of {len(meters)} meters in {elapsed:.2f}s "
+          f"({registered / elapsed if elapsed else 0:.0f} meters/s, {transactions} transactions)")
+
+    return {
+        'statusCode': 200 if registered == len(meters) else 207,
+        'body': json.dumps({
+            'message': f'{registered} of {len(meters)} meters registered',
+            'registered': registered,
+            'failed': len(meters) - registered,
+            'results': results
+        })
+    }
 
 def lambda_handler(event, context):
     try:
@@ -23,49 +188,16 @@ def lambda_handler(event, context):
         if not body:
             return {'statusCode': 400, 'body': json.dumps('Request body is empty')}
 
-        serial_number = body.get('serialNumber', None)
-        zipcode = body.get('zipcode', None)
-        meter_value = body.get('meterValue', None)
-        date = body.get('date', None)
-        coordinate = body.get('coordinate', None)
-
-        # Validation Checks
-        # if not all([serial_number, meter_value, zip_code, date]): # Ensure all fields exist
-        existing = reference_table.get_item(Key={'serialNumber': str(serial_number)})
-
-        if 'Item' in existing:
-            return {'statusCode': 409, 'body': json.dumps({'error': f'Serial number {serial_number} already exists'})}
-
-        if not all([serial_number, meter_value, date, zipcode, coordinate]):  # Ensure all fields exist
-            return {"statusCode": 400, "body": json.dumps({"error": "Missing required fields"})}
-
-        if not isinstance(meter_value, (int, float, Decimal)):  # Ensure it's a number
-            return {"statusCode": 400, "body": json.dumps({"error": "Invalid meterValue. Must be a number."})}
+        if isinstance(body, dict) and 'meters' in body:
+            return register_bulk(body['meters'])
 
-        if not is_valid_zip(zipcode):  # Ensure ZIP code is 5 digits
-            return {"statusCode": 400, "body": json.dumps({"error": "Invalid zipCode. Must be 5 digits."})}
-
-        if not is_valid_date(date):  # Ensure date is YYYY-MM-DD
-            return {"statusCode": 400, "body": json.dumps({"error": "Invalid date format. Use YYYY-MM-DD."})}
-
-        item = {
-            'uuid': str(uuid.uuid4()),
-            'serialNumber': str(serial_number),
-            'meterValue': Decimal(str(meter_value)),
-            'zipcode': str(zipcode),
-            'date': str(date),
-            'timestamp': int(datetime.utcnow().timestamp()),
-            'coordinate': [Decimal(str(coord)) for coord in coordinate]
-        }
-
-        reference_item = {
-            'serialNumber': item['serialNumber'],
-            'zipcode': item['zipcode'],
-            'coordinate': item['coordinate']
-        }
+        item, reference_item, error = build_items(body)
+        if error:
+            return {"statusCode": 400, "body": json.dumps({"error": error})}
 
-        reference_table.put_item(Item=reference_item)
-        meter_table.put_item(Item=item)
+        # One conditional transaction across both tables: no check-then-write race
+        if not register(item, reference_item):
+            return {'statusCode': 409, 'body': json.dumps({'error': f"Serial number {item['serialNumber']} already exists"})}
 
         return {
             'statusCode': 200,
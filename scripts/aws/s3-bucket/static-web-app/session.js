@@ -0,0 +1,46 @@
+// Session tokens shared by every protected page: stores the tokens from the token
+// exchange and renews them with the refresh token before the ID token expires.
+// Each page calls scheduleRefresh(Number(getCookie('token_expires'))) once loaded.
+
+const tokenUrl = "https://<aws-endpoint>.execute-api.us-west-1.amazonaws.com/token";
+const domain = 'd27us82d2go2e4.cloudfront.net';
+// Refresh this long before the ID token expires; once it has, the edge function sends the user back to login
+const refreshMarginMs = 5 * 60 * 1000;
+
+function getCookie(name) {
+  const value = `; ${document.cookie}`;
+  const parts = value.split(`; ${name}=`);
+  if (parts.length === 2) return parts.pop().split(';').shift();
+}
+
+function storeTokens(data) {
+  const expires = Date.now() + data.expires_in * 1000;
+  document.cookie = `id_token=${data.id_token}; path=/; domain=${domain}; secure; SameSite=Lax; max-age=${data.expires_in}`;
+  document.cookie = `access_token=${data.access_token}; path=/; domain=${domain}; secure; SameSite=Lax; max-age=${data.expires_in}`;
+  document.cookie = `token_expires=${expires}; path=/; domain=${domain}; secure; SameSite=Lax; max-age=${data.expires_in}`;
+  // Cognito only returns a refresh token for the code exchange, not when refreshing
+  if (data.refresh_token) {
+    document.cookie = `refresh_token=${data.refresh_token}; path=/; domain=${domain}; secure; SameSite=Lax; max-age=${30*24*60*60}`;
+  }
+  scheduleRefresh(expires);
+}
+
+function scheduleRefresh(expires) {
+  if (!getCookie('refresh_token') || !expires) return;
+  setTimeout(refreshTokens, Math.max(0, expires - refreshMarginMs - Date.now()));
+}
+
+function refreshTokens() {
+  fetch(tokenUrl, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify({ refresh_token: getCookie('refresh_token') })
+  })
+  .then(response => response.ok ? response.json() : Promise.reject(response.status))
+  .then(storeTokens)
+  .catch(error => {
+    console.error("Error refreshing tokens:", error);
+  });
+}
@@ -5,8 +5,12 @@ from folium import plugins
 import json
 import boto3
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, "../aws/lambdas")
+from delta_log import read_local
+
 load_dotenv()
 
 with open("../aws/s3-bucket/data/crescenta_boundaries.geojson", "r") as f:
@@ -34,7 +38,8 @@ meters = plugins.MarkerCluster().add_to(m)
 # todo here instead of df, it should be db loaded from dynamodb
 # todo here instead of df, it should be db loaded from dynamodb
 # todo here instead of df, it should be db loaded from dynamodb
-df_map = pd.read_json("../aws/s3-bucket/data/df.json", orient="records", convert_dates=False)
+# df.json plus any delta segments synced next to it (aws s3 sync --delete)
+df_map = pd.DataFrame(read_local("../aws/s3-bucket/data"))
 df_map[df_map['serialNumber']==1824773589]
 
 